@@ -32,6 +32,10 @@ if not DEBUG and SECRET_KEY.startswith('django-insecure-'):
 
 ALLOWED_HOSTS = [h.strip() for h in os.getenv('ALLOWED_HOSTS', '192.168.178.22,localhost,127.0.0.1').split(',') if h.strip()]
 
+# Render terminates TLS at its proxy and forwards plain HTTP; trust its
+# X-Forwarded-Proto so absolute URLs (pagination `next` links) use https.
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
 
 # ── Installed apps ────────────────────────────────────────────────────────────
 INSTALLED_APPS = [
@@ -54,6 +58,7 @@ INSTALLED_APPS = [
 
 # ── Middleware ────────────────────────────────────────────────────────────────
 MIDDLEWARE = [
+    'utils.perf.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -108,6 +113,25 @@ else:
     }
 
 
+# ── Cache ─────────────────────────────────────────────────────────────────────
+# Local memory by default: per process, which suits tests and a single worker.
+# With several workers point CACHE_URL at a shared cache, e.g.
+# redis://host:6379/0 (needs the `redis` package), or set CACHE_BACKEND to
+# any Django cache backend.
+_cache_url = os.getenv('CACHE_URL', '')
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', (
+            'django.core.cache.backends.redis.RedisCache' if _cache_url
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        )),
+        'LOCATION': _cache_url or 'jamsesh',
+    }
+}
+# Serialized jams and profiles (utils/cache.py).
+REPRESENTATION_CACHE_TIMEOUT = int(os.getenv('REPRESENTATION_CACHE_TIMEOUT', '3600'))   # seconds
+
+
 # ── Password validation ───────────────────────────────────────────────────────
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -145,7 +169,7 @@ else:
 # ── REST Framework ────────────────────────────────────────────────────────────
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ProfileJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -162,6 +186,41 @@ REST_FRAMEWORK = {
     },
 }
 
+# Page sizes for the cursor-paginated list endpoints (see utils/pagination.py).
+# Clients may ask for a different size with ?page_size=, up to the maximum.
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '20'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '100'))
+
+
+# ── Real-time chat ────────────────────────────────────────────────────────────
+# Broker that fans new messages out to /messages/stream/ listeners.
+# The default InMemoryBroker only reaches listeners in the process that saved
+# the message: it is correct only with a single worker process (see
+# render.yaml). Running more workers needs a shared broker such as Redis
+# pub/sub, otherwise members on other workers miss messages until they poll.
+CHAT_BROKER = os.getenv('CHAT_BROKER', 'jams.broker.InMemoryBroker')
+CHAT_STREAM_TIMEOUT = int(os.getenv('CHAT_STREAM_TIMEOUT', '300'))   # seconds
+CHAT_STREAM_KEEPALIVE = 15                                            # seconds
+# Each open stream holds a worker thread. Keep this well below the gunicorn
+# --threads count so ordinary API requests always have threads left; clients
+# past the cap get a 503 and poll ?after= instead.
+CHAT_MAX_STREAMS = int(os.getenv('CHAT_MAX_STREAMS', '4'))
+
+
+# ── Push notifications ────────────────────────────────────────────────────────
+# utils.push delivers Expo notifications from a background thread.
+EXPO_PUSH_URL = os.getenv('EXPO_PUSH_URL', 'https://exp.host/--/api/v2/push/send')
+PUSH_MAX_RETRIES = 3
+PUSH_RETRY_BACKOFF = 0.5   # seconds, doubled on each retry
+
+
+# ── Performance instrumentation ───────────────────────────────────────────────
+# utils.perf.PerformanceMiddleware. Server-Timing reports each request's query
+# count, DB time, view time and serialize time; on by default in development.
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', str(DEBUG)) == 'True'
+# Requests slower than this are logged with their repeated SQL.
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '500'))
+
 
 # ── CORS ──────────────────────────────────────────────────────────────────────
 # Mobile apps bypass CORS (not a browser). Set CORS_ALLOWED_ORIGINS env var
@@ -185,6 +244,21 @@ SIMPLE_JWT = {
 
 # ── Google OAuth ──────────────────────────────────────────────────────────────
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', '')
+GOOGLE_TOKEN_URL = os.getenv('GOOGLE_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+FACEBOOK_GRAPH_URL = os.getenv('FACEBOOK_GRAPH_URL', 'https://graph.facebook.com')
+# Signing keys for local ID-token verification (users/google_auth.py), cached
+# for the max-age Google sends, or this many seconds if it sends none.
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_CERTS_DEFAULT_TTL = 3600
+
+
+# ── Outbound HTTP ─────────────────────────────────────────────────────────────
+# utils.http: one pooled keep-alive session per process for calls made while
+# serving a request (OAuth providers).
+OUTBOUND_HTTP_CONNECT_TIMEOUT = 3    # seconds
+OUTBOUND_HTTP_READ_TIMEOUT = 5       # seconds
+OUTBOUND_HTTP_POOL_SIZE = 16         # connections kept per host; matches the gunicorn threads
 
 
 # ── Email ─────────────────────────────────────────────────────────────────────
@@ -195,3 +269,9 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+EMAIL_TIMEOUT = 10                   # seconds, per SMTP operation
+# Mail is queued in the OutboundEmail table and sent in the background
+# (users/outbox.py); `manage.py send_queued_email` drains it by hand.
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BACKOFF = 30      # seconds, doubled on each retry
+EMAIL_OUTBOX_POLL_INTERVAL = 60      # seconds between sweeps for due retries
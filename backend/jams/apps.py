@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class JamsConfig(AppConfig):
     name = 'jams'
+
+    def ready(self):
+        import jams.signals  # noqa
@@ -0,0 +1,114 @@
+import queue
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription(ABC):
+    """A single listener on a broker channel."""
+
+    @abstractmethod
+    def get(self, timeout):
+        """Block up to `timeout` seconds for the next message; None if none arrived."""
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class BaseBroker(ABC):
+    """Fans chat messages out to every listener on a channel.
+
+    Set CHAT_BROKER to the dotted path of a subclass to swap the transport
+    (e.g. Redis pub/sub when running several worker processes).
+    """
+
+    @abstractmethod
+    def publish(self, channel, message):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel):
+        ...
+
+
+class _QueueSubscription(Subscription):
+    def __init__(self, broker, channel, maxsize):
+        self._broker = broker
+        self._channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self._channel, self)
+
+
+class InMemoryBroker(BaseBroker):
+    """Process-local broker. Every listener must live in the same process as
+    the publisher, so this suits a single (threaded or ASGI) worker and tests."""
+
+    # A listener that falls this far behind drops messages rather than
+    # growing without bound; clients catch up through ?after= on reconnect.
+    max_backlog = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            listeners = list(self._channels.get(channel, ()))
+        for sub in listeners:
+            try:
+                sub.queue.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def subscribe(self, channel):
+        sub = _QueueSubscription(self, channel, self.max_backlog)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, channel, sub):
+        with self._lock:
+            listeners = self._channels.get(channel)
+            if listeners is not None:
+                listeners.discard(sub)
+                if not listeners:
+                    del self._channels[channel]
+
+    def listener_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.CHAT_BROKER)()
+    return _broker
+
+
+def reset_broker():
+    """Drop the shared broker so the next get_broker() builds a fresh one."""
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+def jam_channel(jam_id):
+    return f'jam:{jam_id}'
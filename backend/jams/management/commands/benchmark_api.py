@@ -0,0 +1,184 @@
+import json
+import platform
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jams.management.commands.seed_perf_data import INSTRUMENTS
+from jams.models import JamSession, Message, Participation, Review
+from users.authentication import UserRefreshToken
+from utils.cache import stats
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset and measure latency and query counts of the core '
+        'API endpoints under concurrent load. Writes to the configured database: '
+        'point DATABASE_URL at a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--jams', type=int, default=50_000)
+        parser.add_argument('--messages', type=int, default=2_000_000)
+        parser.add_argument('--reviews', type=int, default=500_000)
+        parser.add_argument('--skip-seed', action='store_true', help='Benchmark the data already there.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark-results.json')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if not options['skip_seed']:
+            call_command(
+                'seed_perf_data', users=options['users'], jams=options['jams'],
+                messages=options['messages'], reviews=options['reviews'], seed=options['seed'],
+                stdout=self.stdout,
+            )
+
+        samples = self._samples(rng, options['requests'])
+        if not samples['participations']:
+            raise CommandError('No participations to benchmark; seed some data first.')
+
+        results = {}
+        # Report query counts in Server-Timing, and keep slow-request logging quiet.
+        with override_settings(ALLOWED_HOSTS=['*'], PERF_SERVER_TIMING=True, PERF_SLOW_REQUEST_MS=10 ** 9):
+            for name, make_request in self._endpoints(samples).items():
+                requests = [make_request(rng) for _ in range(options['requests'])]
+                results[name] = self._run(requests, options['concurrency'])
+                r = results[name]
+                self.stdout.write(
+                    f'{name:<18} p50 {r["p50_ms"]:>8.1f} ms  p99 {r["p99_ms"]:>8.1f} ms  '
+                    f'queries {r["queries_p50"]:>3}/{r["queries_max"]:<3}  errors {r["errors"]}'
+                )
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'requests_per_endpoint': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'dataset': {
+                    'users': User.objects.count(),
+                    'jams': JamSession.objects.count(),
+                    'participations': Participation.objects.count(),
+                    'messages': Message.objects.count(),
+                    'reviews': Review.objects.count(),
+                },
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+    @staticmethod
+    def _samples(rng, n):
+        """Random existing users, jams and memberships to aim requests at."""
+        def pick(queryset, fields):
+            bounds = queryset.order_by('pk')
+            first, last = bounds.values_list('pk', flat=True).first(), bounds.values_list('pk', flat=True).last()
+            if first is None:
+                return []
+            pks = {rng.randint(first, last) for _ in range(n * 2)}
+            return list(queryset.filter(pk__in=pks).values_list(*fields))
+
+        return {
+            'users': pick(User.objects.all(), ('pk', 'username')),
+            'jams': pick(JamSession.objects.all(), ('pk',)),
+            'participations': pick(Participation.objects.all(), ('user_id', 'jam_session_id')),
+        }
+
+    @staticmethod
+    def _endpoints(samples):
+        """name -> rng -> (user_id, url)."""
+        users, jams, memberships = samples['users'], samples['jams'], samples['participations']
+        return {
+            'jam_feed': lambda rng: (rng.choice(users)[0], '/api/jams/'),
+            'my_jams': lambda rng: (rng.choice(memberships)[0], '/api/jams/mine/'),
+            'participants': lambda rng: (rng.choice(users)[0], f'/api/jams/{rng.choice(jams)[0]}/participants/'),
+            'chat_fetch': lambda rng: (lambda m: (m[0], f'/api/jams/{m[1]}/messages/'))(rng.choice(memberships)),
+            'musician_search': lambda rng: (
+                rng.choice(users)[0], f'/api/users/musicians/?q={rng.choice(INSTRUMENTS)}',
+            ),
+            'public_profile': lambda rng: (rng.choice(users)[0], f'/api/users/users/{rng.choice(users)[1]}/'),
+        }
+
+    @staticmethod
+    def _run(requests, concurrency):
+        # Real bearer tokens, minted up front, so each request goes through
+        # the authentication classes the way app traffic does.
+        users = User.objects.in_bulk({user_id for user_id, _ in requests})
+        tokens = {
+            user_id: f'Bearer {UserRefreshToken.for_user(user).access_token}'
+            for user_id, user in users.items()
+        }
+        cache.clear()
+        before = stats.snapshot()
+        local = threading.local()
+
+        def fetch(request):
+            user_id, url = request
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = APIClient()
+            # Requests are spread over many users, which also keeps each one
+            # under the per-user throttle.
+            start = time.perf_counter()
+            response = client.get(url, HTTP_AUTHORIZATION=tokens[user_id])
+            elapsed = (time.perf_counter() - start) * 1000
+            match = QUERIES_RE.search(response.get('Server-Timing', ''))
+            return elapsed, int(match.group(1)) if match else None, response.status_code
+
+        def worker(chunk):
+            try:
+                return [fetch(r) for r in chunk]
+            finally:
+                connection.close()
+
+        chunks = [requests[i::concurrency] for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            rows = [row for chunk in pool.map(worker, chunks) for row in chunk]
+        wall = time.perf_counter() - start
+
+        latencies = sorted(r[0] for r in rows)
+        queries = sorted(r[1] for r in rows if r[1] is not None)
+        after = stats.snapshot()
+
+        def pct(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for r in rows if r[2] >= 400),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p90_ms': round(pct(latencies, 0.90), 2),
+            'p99_ms': round(pct(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'throughput_rps': round(len(rows) / wall, 1),
+            'queries_p50': pct(queries, 0.5),
+            'queries_max': queries[-1] if queries else None,
+            'cache': {
+                name: {k: v - before.get(name, {}).get(k, 0) for k, v in counts.items()}
+                for name, counts in after.items()
+            },
+        }
@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from jams.models import JAM_SEARCH_INDEX, JamSession
+from utils import search
+
+WORDS = (
+    'jazz blues funk rock acoustic electric guitar bass drums piano vocals session '
+    'standards improv groove open mic rehearsal studio backline amp loud quiet late '
+    'evening sunday basement cafe bar park maastricht heerlen sittard venlo roermond'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare full-text search latency with the old icontains filter on '
+        'synthetic jams. Runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = ['jazz', 'maastricht', 'acoustic guitar', 'basement groove', 'xyzzy']
+        with transaction.atomic():
+            host = User.objects.create(username='benchmark-search-host')
+            created = 0
+            for rows in sorted(options['rows']):
+                self._seed(host, rng, rows - created)
+                created = rows
+                search.rebuild(JAM_SEARCH_INDEX, JamSession.objects.all())
+                self.stdout.write(f'\n{rows} jams')
+                self.stdout.write(f'{"query":<18} {"icontains p50/p95 ms":>22} {"search p50/p95 ms":>20}')
+                for q in queries:
+                    old = self._time(lambda: self._icontains(q), options['repeat'])
+                    new = self._time(lambda: self._search(q), options['repeat'])
+                    self.stdout.write(f'{q:<18} {old:>22} {new:>20}')
+            transaction.set_rollback(True)
+
+    def _seed(self, host, rng, n, batch_size=5000):
+        now = timezone.now()
+        for start in range(0, n, batch_size):
+            JamSession.objects.bulk_create([
+                JamSession(
+                    title=' '.join(rng.choices(WORDS, k=3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=25)),
+                    location=rng.choice(WORDS[-5:]).title(),
+                    genre='other',
+                    skill_level='intermediate',
+                    date_time=now + timedelta(hours=rng.randint(1, 24 * 90)),
+                    max_participants=5,
+                    created_by=host,
+                )
+                for _ in range(min(batch_size, n - start))
+            ])
+
+    @staticmethod
+    def _icontains(q):
+        return list(
+            JamSession.objects.filter(
+                Q(title__icontains=q) | Q(description__icontains=q) | Q(location__icontains=q)
+            ).order_by('date_time').values_list('pk', flat=True)[:20]
+        )
+
+    @staticmethod
+    def _search(q):
+        ranked = search.search(JamSession.objects.all(), JAM_SEARCH_INDEX, q)
+        return list(ranked.order_by('date_time').values_list('pk', flat=True)[:20])
+
+    @staticmethod
+    def _time(fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return f'{statistics.median(samples):.2f} / {p95:.2f}'
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from jams import partners
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the JamPartnership (co-play) table from jams and participations.'
+
+    def handle(self, *args, **options):
+        edges = partners.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {edges} jam partner edges.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from jams.models import JAM_SEARCH_INDEX, JamSession
+from users.models import MUSICIAN_SEARCH_INDEX, UserProfile
+from utils import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents for jams and musicians.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            jams = search.rebuild(JAM_SEARCH_INDEX, JamSession.objects.all())
+            musicians = search.rebuild(
+                MUSICIAN_SEARCH_INDEX,
+                UserProfile.objects.select_related('user'),
+                key=lambda profile: profile.user_id,
+            )
+        self.stdout.write(self.style.SUCCESS(f'Indexed {jams} jams and {musicians} musicians.'))
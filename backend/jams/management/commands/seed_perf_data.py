@@ -0,0 +1,173 @@
+import random
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from jams import partners
+from jams.models import JamSession, Message, Participation, Review
+from users.models import UserProfile
+
+USERNAME_PREFIX = 'bench'
+INSTRUMENTS = 'guitar bass drums piano vocals saxophone trumpet violin keys cello'.split()
+GENRES = [g for g, _ in JamSession.GENRE_CHOICES]
+SKILLS = [s for s, _ in JamSession.SKILL_CHOICES]
+TOWNS = [
+    ('Maastricht', 50.85, 5.69), ('Heerlen', 50.89, 5.98), ('Sittard', 51.00, 5.87),
+    ('Venlo', 51.37, 6.17), ('Roermond', 51.19, 5.99), ('Eindhoven', 51.44, 5.48),
+]
+WORDS = 'open jam late night groove standards blues funk session basement acoustic loud'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-insert synthetic users, jams, participations, chat history and reviews '
+        'for performance testing. The same --seed always produces the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--jams', type=int, default=50_000)
+        parser.add_argument('--messages', type=int, default=2_000_000)
+        parser.add_argument('--reviews', type=int, default=500_000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(f'Users named {USERNAME_PREFIX}* already exist; seed an empty database.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self._users(options['users'])
+            jams = self._jams(options['jams'], user_ids)
+            self._messages(options['messages'], jams)
+            self._reviews(options['reviews'], jams)
+            self._rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f} s'))
+
+    def _users(self, n):
+        # bulk_create skips the post_save handlers that would create and then
+        # re-save a profile per user, so the profiles are inserted here too.
+        # One unusable password hash is shared instead of hashing per user.
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'{USERNAME_PREFIX}{i:07d}', email=f'{USERNAME_PREFIX}{i}@example.com', password=password)
+             for i in range(n)),
+            batch_size=self.batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').values_list('pk', flat=True)
+        )
+        UserProfile.objects.bulk_create(
+            (UserProfile(
+                user_id=uid,
+                instruments=', '.join(self.rng.sample(INSTRUMENTS, self.rng.randint(1, 3))),
+                genres=', '.join(self.rng.sample(GENRES, self.rng.randint(1, 2))),
+                skill_level=self.rng.choice(SKILLS),
+                bio='Synthetic benchmark musician.',
+            ) for uid in user_ids),
+            batch_size=self.batch_size,
+        )
+        self.stdout.write(f'{len(user_ids)} users')
+        return user_ids
+
+    def _jams(self, n, user_ids):
+        """Jams over the past and next 60 days near a handful of towns.
+
+        Returns (jam id, date_time, [host, *participants]) per jam.
+        """
+        if not user_ids:
+            return []
+        jams = []
+        for start in range(0, n, self.batch_size):
+            batch, crowds = [], []
+            for _ in range(min(self.batch_size, n - start)):
+                town, lat, lng = self.rng.choice(TOWNS)
+                max_participants = self.rng.randint(3, 12)
+                host = self.rng.choice(user_ids)
+                crowd = [u for u in self.rng.sample(user_ids, min(len(user_ids), max_participants - 1)) if u != host]
+                crowd = crowd[:self.rng.randint(0, len(crowd))]
+                batch.append(JamSession(
+                    title=' '.join(self.rng.sample(WORDS, 3)).title(),
+                    description=' '.join(self.rng.choices(WORDS, k=20)),
+                    genre=self.rng.choice(GENRES),
+                    skill_level=self.rng.choice(SKILLS),
+                    location=town,
+                    latitude=lat + self.rng.uniform(-0.1, 0.1),
+                    longitude=lng + self.rng.uniform(-0.1, 0.1),
+                    date_time=self.now + timedelta(hours=self.rng.randint(-24 * 60, 24 * 60)),
+                    max_participants=max_participants,
+                    participant_count=len(crowd),
+                    created_by_id=host,
+                ))
+                crowds.append(crowd)
+            JamSession.objects.bulk_create(batch)
+            Participation.objects.bulk_create(
+                [Participation(user_id=u, jam_session_id=jam.pk) for jam, crowd in zip(batch, crowds) for u in crowd],
+                batch_size=self.batch_size,
+            )
+            jams.extend((jam.pk, jam.date_time, [jam.created_by_id] + crowd) for jam, crowd in zip(batch, crowds))
+        self.stdout.write(f'{len(jams)} jams')
+        return jams
+
+    def _messages(self, n, jams):
+        """Chat history from each jam's members, spread over the week before it."""
+        if not jams:
+            return
+        for start in range(0, n, self.batch_size):
+            batch, sent_at = [], []
+            for _ in range(min(self.batch_size, n - start)):
+                jam_id, date_time, people = self.rng.choice(jams)
+                batch.append(Message(
+                    jam_session_id=jam_id,
+                    sender_id=self.rng.choice(people),
+                    text=' '.join(self.rng.choices(WORDS, k=8)),
+                ))
+                sent_at.append(min(date_time, self.now) - timedelta(seconds=self.rng.randint(0, 7 * 86400)))
+            # auto_now_add stamps every row with now() on insert; backdate
+            # them afterwards to keep the history.
+            Message.objects.bulk_create(batch)
+            for message, created_at in zip(batch, sent_at):
+                message.created_at = created_at
+            Message.objects.bulk_update(batch, ['created_at'], batch_size=500)
+        self.stdout.write(f'{n} messages')
+
+    def _reviews(self, n, jams):
+        """Reviews only between people who were at the same past jam."""
+        past = [(jam_id, people) for jam_id, date_time, people in jams if date_time < self.now and len(people) > 1]
+        reviewed = set()
+        batch = []
+        attempts = 0
+        while past and len(reviewed) < n and attempts < n * 3:
+            attempts += 1
+            jam_id, people = self.rng.choice(past)
+            reviewer, reviewee = self.rng.sample(people, 2)
+            if (reviewer, reviewee, jam_id) in reviewed:
+                continue
+            reviewed.add((reviewer, reviewee, jam_id))
+            batch.append(Review(
+                reviewer_id=reviewer, reviewee_id=reviewee, jam_session_id=jam_id,
+                showed_up=self.rng.random() < 0.9, would_jam_again=self.rng.random() < 0.7,
+            ))
+            if len(batch) >= self.batch_size:
+                Review.objects.bulk_create(batch)
+                batch = []
+        Review.objects.bulk_create(batch)
+        self.stdout.write(f'{len(reviewed)} reviews')
+
+    def _rebuild_derived(self):
+        # What the signals and views would have maintained row by row.
+        call_command('rebuild_trust_stats', stdout=StringIO())
+        call_command('rebuild_profile_tags', stdout=StringIO())
+        partners.rebuild()
+        call_command('rebuild_search_index', stdout=StringIO())
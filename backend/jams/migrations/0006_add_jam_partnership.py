@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_partnerships(apps, schema_editor):
+    # Same statement as jams.partners.rebuild() when this was written, kept
+    # here so later changes to that module don't alter this migration.
+    JamSession = apps.get_model('jams', 'JamSession')
+    Participation = apps.get_model('jams', 'Participation')
+    JamPartnership = apps.get_model('jams', 'JamPartnership')
+    jams = JamSession._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH members (jam_id, user_id) AS (
+                SELECT id, created_by_id FROM {jams}
+                UNION
+                SELECT jam_session_id, user_id FROM {Participation._meta.db_table}
+            )
+            INSERT INTO {JamPartnership._meta.db_table} (user_id, partner_id, shared_jam_count, last_jam_at)
+            SELECT a.user_id, b.user_id, COUNT(*), MAX(j.date_time)
+            FROM members a
+            JOIN members b ON b.jam_id = a.jam_id AND b.user_id <> a.user_id
+            JOIN {jams} j ON j.id = a.jam_id
+            GROUP BY a.user_id, b.user_id
+        ''')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jams', '0005_add_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JamPartnership',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_jam_count', models.PositiveIntegerField(default=0)),
+                ('last_jam_at', models.DateTimeField()),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jam_partnerships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_jam_at'], name='jampartner_user_recent_idx')],
+                'unique_together': {('user', 'partner')},
+            },
+        ),
+        migrations.RunPython(backfill_partnerships, migrations.RunPython.noop),
+    ]
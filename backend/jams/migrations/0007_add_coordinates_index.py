@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jams', '0006_add_jam_partnership'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jamsession',
+            index=models.Index(fields=['latitude', 'longitude'], name='jamsession_lat_lng_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jams', '0008_add_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jamsession',
+            index=models.Index(fields=['date_time', 'id'], name='jamsession_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jamsession',
+            index=models.Index(fields=['genre', 'date_time'], name='jamsession_genre_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jamsession',
+            index=models.Index(fields=['skill_level', 'date_time'], name='jamsession_skill_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['jam_session', 'created_at', 'id'], name='message_jam_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participation',
+            index=models.Index(fields=['jam_session', 'user'], name='participation_jam_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewee', 'showed_up'], name='review_reviewee_showed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('would_jam_again', True)), fields=['reviewee'], name='review_reviewee_again_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_participant_counts(apps, schema_editor):
+    JamSession = apps.get_model('jams', 'JamSession')
+    Participation = apps.get_model('jams', 'Participation')
+    participants = (
+        Participation.objects.filter(jam_session=OuterRef('pk'))
+        .order_by()
+        .values('jam_session')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    JamSession.objects.update(
+        participant_count=Coalesce(Subquery(participants, output_field=IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jams', '0009_add_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jamsession',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_participant_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jams', '0010_add_participant_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jamsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,5 +1,92 @@
+import math
+
 from django.db import models
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import ASin, Coalesce, Cos, Now, Power, Radians, Sin, Sqrt
 from django.contrib.auth.models import User
+from utils.cache import RepresentationCache
+from utils.search import SearchIndex
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+class JamSessionQuerySet(models.QuerySet):
+    def with_feed_stats(self):
+        """Annotate everything JamSessionSerializer reads so a page of jams
+        costs one query instead of two per row."""
+        latest = Message.objects.filter(jam_session=OuterRef('pk')).order_by('-created_at', '-pk')
+        return self.select_related('created_by').annotate(
+            last_message_text=Subquery(latest.values('text')[:1]),
+            last_message_sender=Subquery(latest.values('sender__username')[:1]),
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+        )
+
+    def near(self, lat, lng, radius_km):
+        """Jams within `radius_km` of (lat, lng), annotated with `distance_km`.
+
+        A bounding box on the (latitude, longitude) index narrows the rows
+        first; the exact haversine distance is only computed for those.
+        """
+        d_lat = radius_km / KM_PER_DEGREE_LAT
+        box = Q(latitude__range=(lat - d_lat, lat + d_lat))
+        # Near the poles the box spans every longitude.
+        d_lng = 180.0
+        if abs(lat) + d_lat < 90:
+            d_lng = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        if d_lng < 180:
+            west, east = lng - d_lng, lng + d_lng
+            if west < -180:
+                box &= Q(longitude__gte=west + 360) | Q(longitude__lte=east)
+            elif east > 180:
+                box &= Q(longitude__gte=west) | Q(longitude__lte=east - 360)
+            else:
+                box &= Q(longitude__range=(west, east))
+
+        lat_rad = math.radians(lat)
+        half_chord = (
+            Power(Sin((Radians('latitude') - Value(lat_rad)) / 2), 2)
+            + Value(math.cos(lat_rad)) * Cos(Radians('latitude'))
+            * Power(Sin((Radians('longitude') - Value(math.radians(lng))) / 2), 2)
+        )
+        return self.filter(box, longitude__isnull=False).annotate(
+            distance_km=2 * EARTH_RADIUS_KM * ASin(Sqrt(half_chord), output_field=FloatField()),
+        ).filter(distance_km__lte=radius_km)
+
+    def claim_spot(self, jam_id):
+        """Take one participant spot on the jam if it has room left.
+
+        A single conditional UPDATE, so concurrent joins can't both see the
+        last spot free (-1 reserves a spot for the organiser). Returns
+        whether a spot was taken; run it in the same transaction as the
+        Participation insert so a failed insert gives the spot back.
+        """
+        return self.filter(
+            pk=jam_id, participant_count__lt=F('max_participants') - 1,
+        ).update(participant_count=F('participant_count') + 1, updated_at=Now()) == 1
+
+    def release_spot(self, jam_id):
+        return self.filter(
+            pk=jam_id, participant_count__gt=0,
+        ).update(participant_count=F('participant_count') - 1, updated_at=Now())
+
+    def touch(self):
+        """Bump updated_at after a change .update() would otherwise not record."""
+        return self.update(updated_at=Now())
+
+    def sync_participant_counts(self):
+        """Recompute participant_count from the Participation rows."""
+        participants = (
+            Participation.objects.filter(jam_session=OuterRef('pk'))
+            .order_by()
+            .values('jam_session')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+        return self.update(
+            participant_count=Coalesce(Subquery(participants, output_field=IntegerField()), Value(0)),
+            updated_at=Now(),
+        )
 
 
 class JamSession(models.Model):
@@ -27,8 +114,27 @@ class JamSession(models.Model):
     longitude = models.FloatField(null=True, blank=True)
     date_time = models.DateTimeField()
     max_participants = models.IntegerField()
+    # Kept in step with Participation: the join view claims a spot
+    # (claim_spot) and every Participation delete releases one (release_spot,
+    # from jams.signals); the organiser is not counted.
+    participant_count = models.PositiveIntegerField(default=0)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Version stamp for conditional GETs: moves whenever anything
+    # JamSessionSerializer shows changes, including a new chat message.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JamSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Upcoming/past feed: date_time range, ordered by (date_time, id).
+            models.Index(fields=['date_time', 'id'], name='jamsession_feed_idx'),
+            # Feed narrowed by ?genre= / ?skill_level=.
+            models.Index(fields=['genre', 'date_time'], name='jamsession_genre_feed_idx'),
+            models.Index(fields=['skill_level', 'date_time'], name='jamsession_skill_feed_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='jamsession_lat_lng_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -40,11 +146,40 @@ class Participation(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        # The unique index serves (user, jam_session) probes and user-only scans;
+        # the reverse one serves per-jam participant lists and counts.
         unique_together = ('user', 'jam_session')
+        indexes = [
+            models.Index(fields=['jam_session', 'user'], name='participation_jam_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.jam_session.title}"
 
+class JamPartnership(models.Model):
+    """Materialised "have jammed together" edge between two members.
+
+    Stored in both directions so a user's partners are one range scan on
+    (user, ...) and a pair check is a point lookup. Maintained by
+    jams.partners from the join/leave/delete views; rebuild with
+    `manage.py rebuild_jam_partners`. last_jam_at is not rolled back
+    when a shared jam goes away — the rebuild recomputes it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jam_partnerships')
+    partner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    shared_jam_count = models.PositiveIntegerField(default=0)
+    last_jam_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'partner')
+        indexes = [
+            models.Index(fields=['user', '-last_jam_at'], name='jampartner_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} <-> {self.partner_id} ({self.shared_jam_count})"
+
+
 class Message(models.Model):
     jam_session = models.ForeignKey(JamSession, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -53,6 +188,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Chat history pages and the feed's latest-message subquery.
+            models.Index(fields=['jam_session', 'created_at', 'id'], name='message_jam_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.text[:50]}"
@@ -68,6 +207,13 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('reviewer', 'reviewee', 'jam_session')
+        indexes = [
+            # Trust stat counts per reviewee (rebuild_trust_stats).
+            models.Index(fields=['reviewee', 'showed_up'], name='review_reviewee_showed_idx'),
+            models.Index(
+                fields=['reviewee'], condition=Q(would_jam_again=True), name='review_reviewee_again_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.reviewer.username} -> {self.reviewee.username} @ {self.jam_session.title}"
@@ -99,3 +245,14 @@ class Report(models.Model):
 
     def __str__(self):
         return f"{self.reporter.username} reported {self.reported_user.username} ({self.reason})"
+
+
+JAM_SEARCH_INDEX = SearchIndex(
+    name='jams_jamsession_search',
+    table='jams_jamsession',
+    key_column='id',
+    document=lambda jam: ' '.join([jam.title, jam.description, jam.location]),
+)
+
+# Serialized jams (without the per-request distance_km), keyed by updated_at.
+JAM_CACHE = RepresentationCache('jam', version=lambda jam: jam.updated_at)
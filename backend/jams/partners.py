@@ -0,0 +1,88 @@
+from django.db import connection, transaction
+from django.db.models import DateTimeField, F, Q, Value
+from django.db.models.functions import Greatest
+from .models import JamSession, JamPartnership, Participation
+
+
+def _member_ids(jam, exclude=None):
+    ids = set(Participation.objects.filter(jam_session=jam).values_list('user_id', flat=True))
+    ids.add(jam.created_by_id)
+    ids.discard(exclude)
+    return ids
+
+
+def _edges_with(user_id, others):
+    return Q(user_id=user_id, partner_id__in=others) | Q(user_id__in=others, partner_id=user_id)
+
+
+def _remove_shared_jam(edges):
+    # Drop edges that are about to reach zero first, so the decrement never
+    # goes below zero even if the table has drifted.
+    JamPartnership.objects.filter(edges, shared_jam_count__lte=1).delete()
+    JamPartnership.objects.filter(edges).update(shared_jam_count=F('shared_jam_count') - 1)
+
+
+def record_join(jam, user):
+    """Call after `user`'s Participation in `jam` has been saved."""
+    if user.id == jam.created_by_id:
+        return  # the organiser was already a member
+    others = _member_ids(jam, exclude=user.id)
+    if not others:
+        return
+    existing = set(
+        JamPartnership.objects.filter(user_id=user.id, partner_id__in=others)
+        .values_list('partner_id', flat=True)
+    )
+    if existing:
+        JamPartnership.objects.filter(_edges_with(user.id, existing)).update(
+            shared_jam_count=F('shared_jam_count') + 1,
+            last_jam_at=Greatest('last_jam_at', Value(jam.date_time, output_field=DateTimeField())),
+        )
+    new_partners = others - existing
+    JamPartnership.objects.bulk_create(
+        [
+            JamPartnership(user_id=a, partner_id=b, shared_jam_count=1, last_jam_at=jam.date_time)
+            for other in new_partners
+            for a, b in ((user.id, other), (other, user.id))
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def record_leave(jam, user):
+    """Call after `user`'s Participation in `jam` has been deleted."""
+    if user.id == jam.created_by_id:
+        return
+    others = _member_ids(jam, exclude=user.id)
+    if others:
+        _remove_shared_jam(_edges_with(user.id, others))
+
+
+def record_jam_deleted(jam):
+    """Call before `jam` is deleted, while its participations still exist."""
+    members = _member_ids(jam)
+    if len(members) > 1:
+        _remove_shared_jam(Q(user_id__in=members, partner_id__in=members))
+
+
+def rebuild():
+    """Recompute every edge from jams and participations in one statement."""
+    jams = JamSession._meta.db_table
+    sql = f'''
+        WITH members (jam_id, user_id) AS (
+            SELECT id, created_by_id FROM {jams}
+            UNION
+            SELECT jam_session_id, user_id FROM {Participation._meta.db_table}
+        )
+        INSERT INTO {JamPartnership._meta.db_table} (user_id, partner_id, shared_jam_count, last_jam_at)
+        SELECT a.user_id, b.user_id, COUNT(*), MAX(j.date_time)
+        FROM members a
+        JOIN members b ON b.jam_id = a.jam_id AND b.user_id <> a.user_id
+        JOIN {jams} j ON j.id = a.jam_id
+        GROUP BY a.user_id, b.user_id
+    '''
+    with transaction.atomic():
+        JamPartnership.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+    return JamPartnership.objects.count()
@@ -0,0 +1,19 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets `Accept: text/event-stream` clients through content negotiation.
+
+    Stream views return their own StreamingHttpResponse; this only renders
+    the error bodies (401/403/404) those requests can still produce.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f'event: error\ndata: {json.dumps(data)}\n\n'.encode()
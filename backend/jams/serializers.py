@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from .models import JamSession, Participation, Message, Review, Report
+from utils.perf import TimedSerializerMixin
+from .models import JamSession, JamPartnership, Participation, Message, Review, Report
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender = serializers.ReadOnlyField(source='sender.username')
 
     class Meta:
@@ -10,26 +11,37 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'sender', 'text', 'created_at']
 
 
-class JamSessionSerializer(serializers.ModelSerializer):
+class JamSessionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.username')
-    participant_count = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
-
-    def get_participant_count(self, obj):
-        return obj.participation_set.count()
+    distance_km = serializers.SerializerMethodField()
 
     def get_last_message(self, obj):
-        msg = obj.messages.last()
+        if hasattr(obj, 'last_message_at'):
+            if obj.last_message_at is None:
+                return None
+            return {
+                'sender': obj.last_message_sender,
+                'text': obj.last_message_text,
+                'created_at': str(obj.last_message_at),
+            }
+        msg = obj.messages.select_related('sender').last()
         if msg:
             return {'sender': msg.sender.username, 'text': msg.text, 'created_at': str(msg.created_at)}
         return None
 
+    def get_distance_km(self, obj):
+        # Only set on location searches (JamSession.objects.near).
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+
     class Meta:
         model = JamSession
         fields = '__all__'
+        read_only_fields = ['participant_count']
 
 
-class ParticipationSerializer(serializers.ModelSerializer):
+class ParticipationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
 
     class Meta:
@@ -37,7 +49,7 @@ class ParticipationSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     reviewer = serializers.ReadOnlyField(source='reviewer.username')
 
     class Meta:
@@ -46,8 +58,16 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['reviewer', 'created_at']
 
 
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = ['id', 'reported_user', 'jam_session', 'reason', 'details', 'created_at']
         read_only_fields = ['created_at']
+
+
+class JamPartnerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    username = serializers.ReadOnlyField(source='partner.username')
+
+    class Meta:
+        model = JamPartnership
+        fields = ['partner', 'username', 'shared_jam_count', 'last_jam_at']
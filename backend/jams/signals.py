@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import UserProfile
+from utils import search
+from .models import JAM_SEARCH_INDEX, JamSession, Participation, Review
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_trust_stats(sender, instance, **kwargs):
+    # Reviews disappear through cascades (jam or reviewer deleted), not a view.
+    UserProfile.adjust_trust_stats(
+        instance.reviewee_id, instance.showed_up, instance.would_jam_again, delta=-1,
+    )
+
+
+@receiver(post_delete, sender=Participation)
+def release_participant_spot(sender, instance, origin=None, **kwargs):
+    # Leaving, account deletion and admin deletes all free the spot here.
+    # When the jam itself is being deleted there is no count left to keep.
+    if isinstance(origin, JamSession) or (hasattr(origin, 'model') and origin.model is JamSession):
+        return
+    JamSession.objects.release_spot(instance.jam_session_id)
+
+
+@receiver(post_save, sender=JamSession)
+def index_jam(sender, instance, **kwargs):
+    search.update_document(JAM_SEARCH_INDEX, instance)
+
+
+@receiver(post_delete, sender=JamSession)
+def unindex_jam(sender, instance, **kwargs):
+    search.remove_document(JAM_SEARCH_INDEX, instance.pk)
@@ -1,3 +1,880 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import UserRefreshToken, claims_user
+from utils.cache import stats
+from . import partners
+from .broker import InMemoryBroker, get_broker, jam_channel, reset_broker
+from .models import JamSession, JamPartnership, Participation, Message, Review
+
+
+def make_jam(user, **kwargs):
+    fields = {
+        'title': 'Sunday session',
+        'description': 'Bring your own amp.',
+        'genre': 'jazz',
+        'skill_level': 'intermediate',
+        'location': 'Maastricht',
+        'date_time': timezone.now() + timedelta(days=1),
+        'max_participants': 5,
+        'created_by': user,
+    }
+    fields.update(kwargs)
+    return JamSession.objects.create(**fields)
+
+
+class JamFeedQueryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+
+    def _populate(self, n):
+        for i in range(n):
+            jam = make_jam(self.host, title=f'Jam {i}')
+            Participation.objects.create(user=self.guest, jam_session=jam)
+            Message.objects.create(jam_session=jam, sender=self.host, text='first')
+            Message.objects.create(jam_session=jam, sender=self.guest, text=f'latest {i}')
+        JamSession.objects.sync_participant_counts()
+
+    def test_feed_query_count_is_constant(self):
+        # Version stamp, page, and one feed-stats query for the cache misses.
+        self._populate(2)
+        with self.assertNumQueries(3):
+            small = self.client.get('/api/jams/')
+        self._populate(8)
+        with self.assertNumQueries(3):
+            large = self.client.get('/api/jams/')
+        self.assertEqual(len(small.data['results']), 2)
+        self.assertEqual(len(large.data['results']), 10)
+        with self.assertNumQueries(2):
+            cached = self.client.get('/api/jams/')
+        self.assertEqual(cached.data, large.data)
+
+    def test_my_jams_query_count_is_constant(self):
+        self.client.force_authenticate(self.guest)
+        self._populate(2)
+        with self.assertNumQueries(3):
+            self.client.get('/api/jams/mine/')
+        self._populate(8)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/jams/mine/')
+        self.assertEqual(len(response.data), 10)
+        with self.assertNumQueries(2):
+            self.client.get('/api/jams/mine/')
+
+    def test_feed_annotations_match_serialized_fields(self):
+        self._populate(1)
+        jam = JamSession.objects.get()
+        response = self.client.get(f'/api/jams/{jam.pk}/')
+        self.assertEqual(response.data['participant_count'], 1)
+        self.assertEqual(response.data['created_by'], 'host')
+        self.assertEqual(response.data['last_message']['sender'], 'guest')
+        self.assertEqual(response.data['last_message']['text'], 'latest 0')
+
+    def test_jam_without_messages(self):
+        make_jam(self.host)
+        response = self.client.get('/api/jams/')
+        jam = response.data['results'][0]
+        self.assertEqual(jam['participant_count'], 0)
+        self.assertIsNone(jam['last_message'])
+
+    def test_my_jams_lists_created_and_joined_once(self):
+        own = make_jam(self.guest, title='Own')
+        Participation.objects.create(user=self.guest, jam_session=own)
+        joined = make_jam(self.host, title='Joined')
+        Participation.objects.create(user=self.guest, jam_session=joined)
+        Participation.objects.create(user=self.host, jam_session=joined)
+        make_jam(self.host, title='Other')
+        JamSession.objects.sync_participant_counts()
+        self.client.force_authenticate(self.guest)
+        response = self.client.get('/api/jams/mine/')
+        self.assertEqual(sorted(j['title'] for j in response.data), ['Joined', 'Own'])
+        counts = {j['title']: j['participant_count'] for j in response.data}
+        self.assertEqual(counts, {'Own': 1, 'Joined': 2})
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host, max_participants=5)
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_feed_is_not_modified_without_serializing(self):
+        first = self.client.get('/api/jams/')
+        self.assertIn('ETag', first)
+        self.assertIn('no-cache', first['Cache-Control'])
+        with self.assertNumQueries(1):
+            second = self._revalidate('/api/jams/', first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+
+    def test_feed_etag_moves_on_join_message_create_and_delete(self):
+        etag = self.client.get('/api/jams/')['ETag']
+
+        self.client.force_authenticate(self.guest)
+        self.client.post('/api/join/', {'jam_session': self.jam.pk})
+        response = self.client.get('/api/jams/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['participant_count'], 1)
+        etag = response['ETag']
+
+        self.client.post(f'/api/jams/{self.jam.pk}/messages/', {'text': 'hi'})
+        response = self.client.get('/api/jams/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['results'][0]['last_message']['text'], 'hi')
+        etag = response['ETag']
+
+        other = make_jam(self.host, title='Other')
+        response = self.client.get('/api/jams/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data['results']), 2)
+        etag = response['ETag']
+
+        other.delete()
+        self.assertEqual(self.client.get('/api/jams/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_etag_depends_on_query(self):
+        etag = self.client.get('/api/jams/')['ETag']
+        response = self.client.get('/api/jams/?genre=rock', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_jam_detail_last_modified(self):
+        url = f'/api/jams/{self.jam.pk}/'
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self._revalidate(url, first).status_code, 304)
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        self.client.force_authenticate(self.guest)
+        self.client.post('/api/join/', {'jam_session': self.jam.pk})
+        self.assertEqual(self._revalidate(url, first).status_code, 200)
+        self.client.delete(f'/api/jams/{self.jam.pk}/leave/')
+        self.assertEqual(self._revalidate(url, first).status_code, 200)
+
+    def test_missing_jam_is_still_404(self):
+        self.assertEqual(self.client.get('/api/jams/9999/').status_code, 404)
+
+    def test_my_jams_etag_is_per_user(self):
+        self.client.force_authenticate(self.host)
+        first = self.client.get('/api/jams/mine/')
+        self.assertEqual(self._revalidate('/api/jams/mine/', first).status_code, 304)
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(self._revalidate('/api/jams/mine/', first).status_code, 200)
+
+
+class JamCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host, latitude=50.85, longitude=5.69)
+        self.url = f'/api/jams/{self.jam.pk}/'
+
+    def test_repeat_reads_hit_the_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(2):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(stats.snapshot()['jam'], {'hits': 1, 'misses': 1})
+
+    def test_write_paths_invalidate(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(self.guest)
+
+        self.client.post('/api/join/', {'jam_session': self.jam.pk})
+        self.assertEqual(self.client.get(self.url).data['participant_count'], 1)
+
+        self.client.post(f'/api/jams/{self.jam.pk}/messages/', {'text': 'hi'})
+        self.assertEqual(self.client.get(self.url).data['last_message']['text'], 'hi')
+
+        self.client.delete(f'/api/jams/{self.jam.pk}/leave/')
+        self.assertEqual(self.client.get(self.url).data['participant_count'], 0)
+
+        self.client.force_authenticate(self.host)
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get('/api/jams/').data['results'], [])
+
+    def test_distance_is_per_request(self):
+        near = self.client.get('/api/jams/?lat=50.85&lng=5.69')
+        far = self.client.get('/api/jams/?lat=50.85&lng=5.9')
+        self.assertEqual(near.data['results'][0]['distance_km'], 0.0)
+        self.assertGreater(far.data['results'][0]['distance_km'], 10)
+        self.assertIsNone(self.client.get(self.url).data['distance_km'])
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_feed_pages_in_date_order_with_id_tiebreak(self):
+        when = timezone.now() + timedelta(days=2)
+        jams = [make_jam(self.host, title=f'Jam {i}', date_time=when) for i in range(5)]
+        seen = self._walk('/api/jams/?page_size=2')
+        self.assertEqual([j['id'] for j in seen], [j.pk for j in jams])
+
+    def test_past_feed_pages_newest_first(self):
+        now = timezone.now()
+        for days in (3, 1, 2):
+            make_jam(self.host, title=f'{days} days ago', date_time=now - timedelta(days=days))
+        seen = self._walk('/api/jams/?past=1&page_size=1')
+        self.assertEqual([j['title'] for j in seen], ['1 days ago', '2 days ago', '3 days ago'])
+
+    def test_insert_between_pages_does_not_shift_cursor(self):
+        start = timezone.now() + timedelta(days=1)
+        for i in range(4):
+            make_jam(self.host, title=f'Jam {i}', date_time=start + timedelta(hours=i))
+        first = self.client.get('/api/jams/?page_size=2')
+        make_jam(self.host, title='Earlier', date_time=start - timedelta(hours=1))
+        second = self.client.get(first.data['next'])
+        self.assertEqual([j['title'] for j in second.data['results']], ['Jam 2', 'Jam 3'])
+
+    def test_next_link_keeps_https_behind_the_proxy(self):
+        for i in range(2):
+            make_jam(self.host, title=f'Jam {i}')
+        response = self.client.get('/api/jams/?page_size=1', HTTP_X_FORWARDED_PROTO='https')
+        self.assertTrue(response.data['next'].startswith('https://'))
+
+    def test_messages_page_newest_first(self):
+        jam = make_jam(self.host)
+        for i in range(3):
+            Message.objects.create(jam_session=jam, sender=self.host, text=f'msg {i}')
+        self.client.force_authenticate(self.host)
+        seen = self._walk(f'/api/jams/{jam.pk}/messages/?page_size=2')
+        self.assertEqual([m['text'] for m in seen], ['msg 2', 'msg 1', 'msg 0'])
+
+
+class IncrementalChatTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host)
+        Participation.objects.create(user=self.guest, jam_session=self.jam)
+        self.url = f'/api/jams/{self.jam.pk}/messages/'
+        self.client.force_authenticate(self.guest)
+
+    def _say(self, text, sender=None):
+        return Message.objects.create(jam_session=self.jam, sender=sender or self.host, text=text)
+
+    def test_returns_only_newer_messages_oldest_first(self):
+        seen = self._say('old')
+        self._say('new 1', sender=self.guest)
+        self._say('new 2')
+        response = self.client.get(self.url, {'after': seen.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['text'] for m in response.data], ['new 1', 'new 2'])
+        self.assertEqual(response.data[0]['sender'], 'guest')
+
+    def test_nothing_new_is_304(self):
+        last = self._say('hello')
+        response = self.client.get(self.url, {'after': last.pk})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_poll_query_count_is_constant(self):
+        last = self._say('hello')
+        for i in range(20):
+            self._say(f'msg {i}')
+        # membership check + messages; authentication is forced here.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'after': last.pk})
+        self.assertEqual(len(response.data), 20)
+
+    def test_non_member_is_forbidden(self):
+        outsider = User.objects.create_user('outsider', password='pw-123456')
+        self.client.force_authenticate(outsider)
+        response = self.client.get(self.url, {'after': 0})
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_after_is_rejected(self):
+        response = self.client.get(self.url, {'after': 'latest'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', email='host@example.com', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host)
+        Participation.objects.create(user=self.guest, jam_session=self.jam)
+        self.url = f'/api/jams/{self.jam.pk}/messages/'
+        Message.objects.create(jam_session=self.jam, sender=self.host, text='hello')
+
+    def _bearer(self, user):
+        token = UserRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_reads_authenticate_without_a_user_query(self):
+        self._bearer(self.guest)
+        # membership check + messages, as with forced authentication.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'after': 0})
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_member_is_still_forbidden(self):
+        self._bearer(User.objects.create_user('outsider', password='pw-123456'))
+        self.assertEqual(self.client.get(self.url, {'after': 0}).status_code, 403)
+
+    def test_writes_load_the_user(self):
+        self._bearer(self.guest)
+        response = self.client.post(self.url, {'text': 'hi'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Message.objects.latest('pk').sender, self.guest)
+
+    def test_unclaimed_fields_load_in_one_query(self):
+        user = claims_user(id=self.host.pk, username='host')
+        with self.assertNumQueries(0):
+            self.assertEqual(user, self.host)
+            self.assertEqual(user.username, 'host')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'host@example.com')
+            self.assertTrue(user.is_active)
+            self.assertTrue(user.check_password('pw-123456'))
+
+    def test_refreshed_access_tokens_keep_the_username(self):
+        response = self.client.post('/api/users/login/', {'username': 'guest', 'password': 'pw-123456'})
+        refreshed = self.client.post('/api/users/token/refresh/', {'refresh': response.data['refresh']})
+        self.assertEqual(AccessToken(refreshed.data['access'])['username'], 'guest')
+
+
+class InMemoryBrokerTests(SimpleTestCase):
+    def test_fans_out_to_every_listener_on_the_channel(self):
+        broker = InMemoryBroker()
+        first, second = broker.subscribe('jam:1'), broker.subscribe('jam:1')
+        other = broker.subscribe('jam:2')
+        broker.publish('jam:1', {'id': 1})
+        self.assertEqual(first.get(timeout=0), {'id': 1})
+        self.assertEqual(second.get(timeout=0), {'id': 1})
+        self.assertIsNone(other.get(timeout=0))
+
+    def test_close_unsubscribes(self):
+        broker = InMemoryBroker()
+        sub = broker.subscribe('jam:1')
+        sub.close()
+        sub.close()
+        self.assertEqual(broker.listener_count('jam:1'), 0)
+        broker.publish('jam:1', {'id': 1})
+        self.assertIsNone(sub.get(timeout=0))
+
+
+@override_settings(CHAT_STREAM_TIMEOUT=5, CHAT_STREAM_KEEPALIVE=0.05)
+class MessageStreamTests(APITestCase):
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host)
+        Participation.objects.create(user=self.guest, jam_session=self.jam)
+        self.url = f'/api/jams/{self.jam.pk}/messages/stream/'
+
+    def _open(self, user, **extra):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream', **extra)
+        self.addCleanup(response.close)
+        return response
+
+    def test_posted_message_reaches_every_member(self):
+        host_stream = self._open(self.host)
+        guest_stream = self._open(self.guest)
+        self.assertEqual(host_stream['Content-Type'], 'text/event-stream')
+        self.client.force_authenticate(self.guest)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/jams/{self.jam.pk}/messages/', {'text': 'hi all'})
+        for response in (host_stream, guest_stream):
+            event = next(iter(response.streaming_content)).decode()
+            self.assertIn('event: message', event)
+            self.assertIn('"text": "hi all"', event)
+            self.assertIn('"sender": "guest"', event)
+
+    def test_idle_stream_sends_keepalives(self):
+        response = self._open(self.guest)
+        self.assertEqual(next(iter(response.streaming_content)), b': keepalive\n\n')
+
+    def test_replays_messages_after_last_event_id(self):
+        seen = Message.objects.create(jam_session=self.jam, sender=self.host, text='seen')
+        Message.objects.create(jam_session=self.jam, sender=self.host, text='missed')
+        response = self._open(self.guest, HTTP_LAST_EVENT_ID=str(seen.pk))
+        event = next(iter(response.streaming_content)).decode()
+        self.assertIn('"text": "missed"', event)
+
+    def test_non_member_is_forbidden(self):
+        outsider = User.objects.create_user('outsider', password='pw-123456')
+        response = self._open(outsider)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(get_broker().listener_count(jam_channel(self.jam.pk)), 0)
+
+    @override_settings(CHAT_MAX_STREAMS=1)
+    def test_streams_past_the_cap_are_turned_away(self):
+        first = self._open(self.guest)
+        self.assertEqual(first.status_code, 200)
+        busy = self._open(self.host)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy['Retry-After'], '5')
+        self.assertEqual(get_broker().listener_count(jam_channel(self.jam.pk)), 1)
+        first.close()
+        self.assertEqual(self._open(self.host).status_code, 200)
+
+    def test_closing_the_response_releases_the_subscription(self):
+        response = self._open(self.guest)
+        self.assertEqual(get_broker().listener_count(jam_channel(self.jam.pk)), 1)
+        response.close()
+        self.assertEqual(get_broker().listener_count(jam_channel(self.jam.pk)), 0)
+
+
+class JoinCapacityTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.jam = make_jam(self.host, max_participants=3)
+        self.guests = [User.objects.create_user(f'guest{i}', password='pw-123456') for i in range(3)]
+
+    def _join(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/join/', {'jam_session': self.jam.pk})
+
+    def test_join_fills_up_to_capacity(self):
+        self.assertEqual(self._join(self.guests[0]).status_code, 201)
+        self.assertEqual(self._join(self.guests[1]).status_code, 201)
+        response = self._join(self.guests[2])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'This jam session is full.')
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 2)
+        self.assertEqual(self.client.get(f'/api/jams/{self.jam.pk}/').data['participant_count'], 2)
+
+    def test_duplicate_join_gives_the_spot_back(self):
+        self._join(self.guests[0])
+        response = self._join(self.guests[0])
+        self.assertEqual(response.data['detail'], 'You have already joined this session.')
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 1)
+
+    def test_leave_frees_a_spot(self):
+        self._join(self.guests[0])
+        self._join(self.guests[1])
+        self.client.force_authenticate(self.guests[0])
+        self.assertEqual(self.client.delete(f'/api/jams/{self.jam.pk}/leave/').status_code, 204)
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 1)
+        self.assertEqual(self._join(self.guests[2]).status_code, 201)
+
+    def test_deleted_account_frees_its_spots(self):
+        self._join(self.guests[0])
+        self.client.force_authenticate(self.guests[0])
+        self.client.post('/api/users/delete-account/', {'password': 'pw-123456'})
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 0)
+
+    def test_deleted_account_with_drifted_count(self):
+        # A count that has drifted to 0 must not block the deletion.
+        Participation.objects.create(user=self.guests[0], jam_session=self.jam)
+        self.client.force_authenticate(self.guests[0])
+        response = self.client.post('/api/users/delete-account/', {'password': 'pw-123456'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(pk=self.guests[0].pk).exists())
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 0)
+
+    def test_any_participation_delete_frees_a_spot(self):
+        self._join(self.guests[0])
+        self._join(self.guests[1])
+        before = JamSession.objects.get(pk=self.jam.pk).updated_at
+        Participation.objects.filter(user=self.guests[0]).delete()
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 1)
+        self.assertGreater(self.jam.updated_at, before)
+
+    def test_sync_participant_counts(self):
+        Participation.objects.create(user=self.guests[0], jam_session=self.jam)
+        JamSession.objects.sync_participant_counts()
+        self.jam.refresh_from_db()
+        self.assertEqual(self.jam.participant_count, 1)
+
+
+class ConcurrentJoinTests(TransactionTestCase):
+    def test_simultaneous_joins_never_overfill(self):
+        host = User.objects.create_user('host', password='pw-123456')
+        jam = make_jam(host, max_participants=6)
+        guests = [User.objects.create(username=f'guest{i}') for i in range(20)]
+
+        def join(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                for _ in range(50):
+                    try:
+                        return client.post('/api/join/', {'jam_session': jam.pk}).status_code
+                    except OperationalError:
+                        # SQLite's shared in-memory test database reports
+                        # "table is locked" instead of waiting, sometimes after
+                        # the join committed; retry like a client would.
+                        time.sleep(0.02)
+                # Raised in the worker, re-raised by pool.map below.
+                self.fail(f'{user.username} still hit a locked table after 50 attempts')
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            statuses = list(pool.map(join, guests))
+
+        jam.refresh_from_db()
+        joined = Participation.objects.filter(jam_session=jam).count()
+        # Every guest got an answer, and only the five free spots were taken.
+        self.assertEqual(len(statuses), 20)
+        self.assertLessEqual(statuses.count(201), 5)
+        self.assertEqual(joined, 5)
+        self.assertEqual(jam.participant_count, 5)
+
+
+class SeedPerfDataTests(APITestCase):
+    def _seed(self, **kwargs):
+        options = {'users': 30, 'jams': 15, 'messages': 120, 'reviews': 20, 'batch_size': 7}
+        options.update(kwargs)
+        call_command('seed_perf_data', stdout=StringIO(), **options)
+
+    def test_bulk_seeds_consistent_data(self):
+        from users.models import UserProfile
+        self._seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(UserProfile.objects.count(), 30)
+        self.assertEqual(JamSession.objects.exclude(latitude=None).count(), 15)
+        self.assertEqual(Message.objects.count(), 120)
+        self.assertFalse(Message.objects.filter(created_at__gt=timezone.now()).exists())
+        # Backdated after the insert, without touching the shared field.
+        self.assertTrue(Message.objects.filter(created_at__lt=timezone.now() - timedelta(hours=1)).exists())
+        self.assertTrue(Message._meta.get_field('created_at').auto_now_add)
+        for jam in JamSession.objects.all():
+            self.assertEqual(jam.participant_count, jam.participation_set.count())
+            self.assertLess(jam.participant_count, jam.max_participants)
+        reviewed = User.objects.get(pk=Review.objects.values_list('reviewee', flat=True)[0])
+        self.assertEqual(
+            reviewed.profile.reviews_received_count, Review.objects.filter(reviewee=reviewed).count(),
+        )
+
+    def test_same_seed_same_data(self):
+        self._seed(seed=7)
+        first = list(JamSession.objects.order_by('pk').values_list('title', 'participant_count'))
+        Message.objects.all().delete()
+        User.objects.all().delete()
+        self._seed(seed=7)
+        self.assertEqual(list(JamSession.objects.order_by('pk').values_list('title', 'participant_count')), first)
+
+    def test_refuses_to_seed_twice(self):
+        self._seed()
+        with self.assertRaises(CommandError):
+            self._seed()
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    def test_seeds_and_reports_every_endpoint(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as out:
+            call_command(
+                'benchmark_api', users=40, jams=20, messages=200, reviews=30,
+                requests=6, concurrency=2, output=out.name, stdout=StringIO(),
+            )
+            report = json.load(open(out.name))
+        self.assertEqual(report['meta']['dataset']['users'], 40)
+        self.assertEqual(report['meta']['dataset']['messages'], 200)
+        self.assertEqual(JamSession.objects.filter(participant_count__gt=0).count(),
+                         JamSession.objects.filter(participation__isnull=False).distinct().count())
+        self.assertEqual(set(report['endpoints']), {
+            'jam_feed', 'my_jams', 'participants', 'chat_fetch', 'musician_search', 'public_profile',
+        })
+        for result in report['endpoints'].values():
+            self.assertEqual(result['requests'], 6)
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['queries_max'], 0)
+
+
+class ParticipantListTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.me = User.objects.create_user('me', password='pw-123456')
+        self.jam = make_jam(self.host, max_participants=50)
+        Participation.objects.create(user=self.me, jam_session=self.jam)
+        self.url = f'/api/jams/{self.jam.pk}/participants/'
+
+    def _join(self, n):
+        for i in range(n):
+            user = User.objects.create_user(f'player{User.objects.count()}')
+            Participation.objects.create(user=user, jam_session=self.jam)
+
+    def test_query_count_is_constant(self):
+        self.client.force_authenticate(self.me)
+        self._join(2)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        self._join(15)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['participants']), 18)
+
+    def test_jammed_before(self):
+        via_join = User.objects.create_user('via_join')
+        via_host = User.objects.create_user('via_host')
+        only_here = User.objects.create_user('only_here')
+        for user in (via_join, via_host, only_here):
+            Participation.objects.create(user=user, jam_session=self.jam)
+        # me and via_join both joined an earlier jam
+        earlier = make_jam(self.host)
+        Participation.objects.create(user=self.me, jam_session=earlier)
+        Participation.objects.create(user=via_join, jam_session=earlier)
+        # via_host hosted a jam that I joined
+        hosted = make_jam(via_host)
+        Participation.objects.create(user=self.me, jam_session=hosted)
+        partners.rebuild()
+
+        self.client.force_authenticate(self.me)
+        response = self.client.get(self.url)
+        flags = {p['username']: p['jammed_before'] for p in response.data['participants']}
+        self.assertEqual(flags, {'me': False, 'via_join': True, 'via_host': True, 'only_here': False})
+        self.assertEqual(response.data['created_by'], 'host')
+
+    def test_anonymous_sees_no_history(self):
+        response = self.client.get(self.url)
+        self.assertEqual([p['jammed_before'] for p in response.data['participants']], [False])
+
+
+class JamPartnershipTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.a = User.objects.create_user('a', password='pw-123456')
+        self.b = User.objects.create_user('b', password='pw-123456')
+        self.jam = make_jam(self.host, max_participants=10)
+
+    def _join(self, user, jam=None):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/join/', {'jam_session': (jam or self.jam).pk})
+        self.assertEqual(response.status_code, 201)
+
+    def _edges(self):
+        return {
+            (e.user.username, e.partner.username): e.shared_jam_count
+            for e in JamPartnership.objects.select_related('user', 'partner')
+        }
+
+    def test_join_leave_and_delete_maintain_edges(self):
+        self._join(self.a)
+        self._join(self.b)
+        self.assertEqual(self._edges(), {
+            ('a', 'host'): 1, ('host', 'a'): 1, ('b', 'host'): 1, ('host', 'b'): 1,
+            ('a', 'b'): 1, ('b', 'a'): 1,
+        })
+        second = make_jam(self.host, date_time=self.jam.date_time + timedelta(days=7))
+        self._join(self.a, second)
+        self.assertEqual(self._edges()[('a', 'host')], 2)
+        self.assertEqual(
+            JamPartnership.objects.get(user=self.a, partner=self.host).last_jam_at, second.date_time,
+        )
+
+        self.client.force_authenticate(self.b)
+        self.client.delete(f'/api/jams/{self.jam.pk}/leave/')
+        self.assertNotIn(('a', 'b'), self._edges())
+
+        self.client.force_authenticate(self.host)
+        self.client.delete(f'/api/jams/{self.jam.pk}/')
+        self.assertEqual(self._edges(), {('a', 'host'): 1, ('host', 'a'): 1})
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        self._join(self.a)
+        self._join(self.b)
+        other = make_jam(self.a)
+        self._join(self.b, other)
+        expected = self._edges()
+        JamPartnership.objects.all().delete()
+        call_command('rebuild_jam_partners', stdout=StringIO())
+        self.assertEqual(self._edges(), expected)
+
+    def test_partner_list(self):
+        self._join(self.a)
+        self._join(self.b)
+        self.client.force_authenticate(self.a)
+        response = self.client.get('/api/partners/')
+        self.assertEqual(
+            sorted((p['username'], p['shared_jam_count']) for p in response.data['results']),
+            [('b', 1), ('host', 1)],
+        )
+
+
+class NearbyJamTests(APITestCase):
+    MAASTRICHT = (50.8514, 5.6910)
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        make_jam(self.host, title='Vrijthof', latitude=50.8484, longitude=5.6889)
+        make_jam(self.host, title='Heerlen', latitude=50.8882, longitude=5.9795)
+        make_jam(self.host, title='Amsterdam', latitude=52.3676, longitude=4.9041)
+        make_jam(self.host, title='Nowhere')
+
+    def _titles(self, **params):
+        response = self.client.get('/api/jams/', params)
+        self.assertEqual(response.status_code, 200)
+        return [j['title'] for j in response.data['results']], response
+
+    def test_filters_by_radius(self):
+        lat, lng = self.MAASTRICHT
+        titles, _ = self._titles(lat=lat, lng=lng, radius_km=30)
+        self.assertEqual(sorted(titles), ['Heerlen', 'Vrijthof'])
+
+    def test_sorts_by_distance(self):
+        lat, lng = self.MAASTRICHT
+        titles, response = self._titles(lat=lat, lng=lng, radius_km=300, sort='distance')
+        self.assertEqual(titles, ['Vrijthof', 'Heerlen', 'Amsterdam'])
+        distances = [j['distance_km'] for j in response.data['results']]
+        self.assertLess(distances[0], 1)
+        self.assertAlmostEqual(distances[2], 177.1, delta=0.1)
+
+    def test_distance_pages_follow_cursor(self):
+        lat, lng = self.MAASTRICHT
+        first = self.client.get('/api/jams/', {
+            'lat': lat, 'lng': lng, 'radius_km': 300, 'sort': 'distance', 'page_size': 2,
+        })
+        second = self.client.get(first.data['next'])
+        self.assertEqual([j['title'] for j in second.data['results']], ['Amsterdam'])
+
+    def test_box_wraps_the_antimeridian(self):
+        make_jam(self.host, title='Fiji east', latitude=-17.0, longitude=179.9)
+        make_jam(self.host, title='Fiji west', latitude=-17.0, longitude=-179.9)
+        titles, _ = self._titles(lat=-17.0, lng=179.95, radius_km=50)
+        self.assertEqual(sorted(titles), ['Fiji east', 'Fiji west'])
+
+    def test_rejects_bad_coordinates(self):
+        self.assertEqual(self.client.get('/api/jams/', {'lat': 50}).status_code, 400)
+        self.assertEqual(self.client.get('/api/jams/', {'lat': 95, 'lng': 5}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/jams/', {'lat': 50, 'lng': 5, 'radius_km': 0}).status_code, 400,
+        )
+
+
+class JamSearchTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.jazz = make_jam(self.host, title='Jazz night', description='Standards and ballads', location='Maastricht')
+        self.rock = make_jam(self.host, title='Rock jam', description='Loud guitars, some jazz', location='Heerlen')
+
+    def _titles(self, q, **params):
+        response = self.client.get('/api/jams/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [j['title'] for j in response.data['results']]
+
+    def test_matches_word_prefixes_across_fields(self):
+        self.assertEqual(self._titles('maas'), ['Jazz night'])
+        self.assertEqual(self._titles('guitar heer'), ['Rock jam'])
+        self.assertEqual(sorted(self._titles('jazz')), ['Jazz night', 'Rock jam'])
+        self.assertEqual(self._titles('jazz heerlen'), ['Rock jam'])
+
+    def test_sort_by_relevance(self):
+        make_jam(self.host, title='Jazz jazz jazz', description='jazz', location='Jazzstad')
+        titles = self._titles('jazz', sort='relevance')
+        self.assertEqual(titles[0], 'Jazz jazz jazz')
+        self.assertEqual(len(titles), 3)
+
+    def test_index_follows_save_and_delete(self):
+        self.rock.title = 'Funk jam'
+        self.rock.save()
+        self.assertEqual(self._titles('funk'), ['Funk jam'])
+        self.assertEqual(self._titles('rock'), [])
+        self.jazz.delete()
+        self.assertEqual(self._titles('maastricht'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self._titles('"jazz" OR NOT*'), [])
+        self.assertEqual(self._titles('!!!'), [])
+
+    def test_rebuild_command(self):
+        JamSession.objects.filter(pk=self.jazz.pk).update(title='Blues night')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._titles('blues'), ['Blues night'])
+
+
+class HotQueryIndexTests(APITestCase):
+    """EXPLAIN each hot query and check it is answered from an index."""
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.jam = make_jam(self.host)
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be sequentially scanned.
+            # LOCAL ends with the test's transaction, so later tests on this
+            # connection plan as usual.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            table = queryset.model._meta.db_table
+            self.assertNotRegex(plan, rf'SCAN {table}\b(?! USING)', plan)
+        else:
+            self.assertNotIn('Seq Scan', plan, plan)
+        if index_name:
+            self.assertIn(index_name, plan)
+
+    def test_feed(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            JamSession.objects.filter(date_time__gte=now).order_by('date_time', 'id'),
+            'jamsession_feed_idx',
+        )
+        self.assertUsesIndex(
+            JamSession.objects.filter(date_time__lt=now).order_by('-date_time', '-id'),
+            'jamsession_feed_idx',
+        )
+        self.assertUsesIndex(
+            JamSession.objects.filter(date_time__gte=now, genre='jazz').order_by('date_time'),
+            'jamsession_genre_feed_idx',
+        )
+        self.assertUsesIndex(
+            JamSession.objects.filter(date_time__gte=now, skill_level='advanced').order_by('date_time'),
+            'jamsession_skill_feed_idx',
+        )
+
+    def test_chat_history(self):
+        self.assertUsesIndex(
+            Message.objects.filter(jam_session=self.jam).order_by('-created_at', '-id'),
+            'message_jam_created_idx',
+        )
+
+    def test_participation_probes(self):
+        self.assertUsesIndex(Participation.objects.filter(user=self.host, jam_session=self.jam))
+        self.assertUsesIndex(Participation.objects.filter(user=self.host))
+        self.assertUsesIndex(
+            Participation.objects.filter(jam_session=self.jam).values('user_id'),
+            'participation_jam_user_idx',
+        )
+
+    def test_review_counts(self):
+        self.assertUsesIndex(
+            Review.objects.filter(reviewee=self.host, showed_up=True).values('pk'),
+            'review_reviewee_showed_idx',
+        )
+        self.assertUsesIndex(
+            Review.objects.filter(reviewee=self.host, would_jam_again=True).values('pk'),
+            'review_reviewee_again_idx',
+        )
@@ -1,8 +1,8 @@
 from django.urls import path
 from .views import (
     JamSessionListCreateView, JamSessionRetrieveDestroyView,
-    MyJamsView, ParticipationCreateView, MessageListCreateView,
-    ParticipantListView, LeaveJamView, ReviewCreateView, ReportCreateView,
+    MyJamsView, ParticipationCreateView, MessageListCreateView, MessageStreamView,
+    ParticipantListView, LeaveJamView, ReviewCreateView, ReportCreateView, JamPartnerListView,
 )
 
 urlpatterns = [
@@ -10,9 +10,11 @@ urlpatterns = [
     path('jams/mine/', MyJamsView.as_view(), name='my-jams'),
     path('jams/<int:pk>/', JamSessionRetrieveDestroyView.as_view(), name='jam-detail'),
     path('jams/<int:jam_pk>/messages/', MessageListCreateView.as_view(), name='jam-messages'),
+    path('jams/<int:jam_pk>/messages/stream/', MessageStreamView.as_view(), name='jam-message-stream'),
     path('jams/<int:jam_pk>/participants/', ParticipantListView.as_view(), name='jam-participants'),
     path('jams/<int:jam_pk>/leave/', LeaveJamView.as_view(), name='leave-jam'),
     path('jams/<int:jam_pk>/review/', ReviewCreateView.as_view(), name='jam-review'),
     path('join/', ParticipationCreateView.as_view(), name='join-jam'),
     path('report/', ReportCreateView.as_view(), name='report'),
+    path('partners/', JamPartnerListView.as_view(), name='jam-partners'),
 ]
@@ -1,23 +1,77 @@
+import json
+import threading
+import time
+
 from rest_framework import generics, permissions
-from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.exceptions import APIException, ValidationError, PermissionDenied
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db import IntegrityError
-from django.db.models import Q
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from .models import JamSession, Participation, Message, Review, Report
-from .serializers import JamSessionSerializer, ParticipationSerializer, MessageSerializer, ReviewSerializer, ReportSerializer
+from .models import JAM_CACHE, JAM_SEARCH_INDEX, JamSession, JamPartnership, Participation, Message, Review, Report
+from .serializers import (
+    JamSessionSerializer, ParticipationSerializer, MessageSerializer, ReviewSerializer,
+    ReportSerializer, JamPartnerSerializer,
+)
+from users.authentication import ClaimsJWTAuthentication
 from users.permissions import IsNotBanned
 from users.models import UserProfile
+from utils import search
+from utils.conditional import ConditionalGetMixin
 from utils.push import send_push
+from utils.pagination import JamCursorPagination, MessageCursorPagination, PartnerCursorPagination
+from . import partners
+from .broker import get_broker, jam_channel
+from .renderers import EventStreamRenderer
+
+
+def serialize_jams(jams, request):
+    """JamSessionSerializer output for `jams`, served from JAM_CACHE.
+
+    Misses are re-read with the feed stats in one query. distance_km depends
+    on the request, so it is filled in from the given instances.
+    """
+    def render(missing):
+        fresh = JamSession.objects.with_feed_stats().in_bulk([jam.pk for jam in missing])
+        return JamSessionSerializer(
+            [fresh.get(jam.pk, jam) for jam in missing], many=True, context={'request': request},
+        ).data
+
+    data = JAM_CACHE.get_many(jams, render)
+    for jam, item in zip(jams, data):
+        distance = getattr(jam, 'distance_km', None)
+        item['distance_km'] = round(distance, 2) if distance is not None else None
+    return data
 
 
-class JamSessionListCreateView(generics.ListCreateAPIView):
+class JamSessionListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = JamSessionSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = JamCursorPagination
+    default_radius_km = 25
+    max_radius_km = 500
 
     def get_queryset(self):
+        # Plain rows: the feed stats are only computed for cache misses.
+        return self._filtered_queryset()
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(serialize_jams(page, request))
+
+    def get_version_stamp(self):
+        # Deleting a jam lowers the count without moving max(updated_at),
+        # so only the ETag is reliable here.
+        stamp = self._filtered_queryset().order_by().aggregate(n=Count('pk'), modified=Max('updated_at'))
+        return (stamp['n'], stamp['modified']), None
+
+    def _filtered_queryset(self):
         now = timezone.now()
         if self.request.query_params.get('past') == '1':
             qs = JamSession.objects.filter(date_time__lt=now).order_by('-date_time')
@@ -27,15 +81,39 @@ class JamSessionListCreateView(generics.ListCreateAPIView):
         genre = self.request.query_params.get('genre', '').strip()
         skill = self.request.query_params.get('skill_level', '').strip()
         if q:
-            qs = qs.filter(
-                Q(title__icontains=q) | Q(description__icontains=q) | Q(location__icontains=q)
-            )
+            ranked = search.search(qs, JAM_SEARCH_INDEX, q)
+            if ranked is None:
+                qs = qs.filter(
+                    Q(title__icontains=q) | Q(description__icontains=q) | Q(location__icontains=q)
+                )
+            else:
+                qs = ranked
         if genre:
             qs = qs.filter(genre=genre)
         if skill:
             qs = qs.filter(skill_level=skill)
+        near = self._near_params()
+        if near:
+            qs = qs.near(*near)
         return qs
 
+    def _near_params(self):
+        """Parse ?lat=&lng=&radius_km= into floats, or None when not given."""
+        params = self.request.query_params
+        if 'lat' not in params and 'lng' not in params:
+            return None
+        try:
+            lat = float(params['lat'])
+            lng = float(params['lng'])
+            radius_km = float(params.get('radius_km', self.default_radius_km))
+        except (KeyError, ValueError):
+            raise ValidationError({'detail': 'lat and lng must both be given as numbers.'})
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({'detail': 'lat/lng out of range.'})
+        if not (0 < radius_km <= self.max_radius_km):
+            raise ValidationError({'radius_km': f'Must be between 0 and {self.max_radius_km}.'})
+        return lat, lng, radius_km
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsNotBanned()]
@@ -65,11 +143,21 @@ class JamSessionListCreateView(generics.ListCreateAPIView):
         return score
 
 
-class JamSessionRetrieveDestroyView(generics.RetrieveDestroyAPIView):
+class JamSessionRetrieveDestroyView(ConditionalGetMixin, generics.RetrieveDestroyAPIView):
     queryset = JamSession.objects.all()
     serializer_class = JamSessionSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def retrieve(self, request, *args, **kwargs):
+        return Response(serialize_jams([self.get_object()], request)[0])
+
+    def get_version_stamp(self):
+        modified = get_object_or_404(
+            JamSession.objects.values_list('updated_at', flat=True), pk=self.kwargs['pk'],
+        )
+        return (self.kwargs['pk'], modified), modified
+
     def perform_destroy(self, instance):
         if instance.created_by != self.request.user:
             raise PermissionDenied('You can only delete your own sessions.')
@@ -86,18 +174,35 @@ class JamSessionRetrieveDestroyView(generics.RetrieveDestroyAPIView):
                 body=f'"{instance.title}" has been cancelled by the organiser.',
                 data={'screen': 'Main'},
             )
-        instance.delete()
+        with transaction.atomic():
+            # Take the row lock claim_spot takes, so a join committing now
+            # either lands before the member list is read or waits and
+            # finds the jam gone.
+            instance = JamSession.objects.select_for_update().get(pk=instance.pk)
+            partners.record_jam_deleted(instance)
+            instance.delete()
 
 
-class MyJamsView(generics.ListAPIView):
+class MyJamsView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = JamSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        return self._my_jams().order_by('date_time')
+
+    def list(self, request, *args, **kwargs):
+        return Response(serialize_jams(list(self.get_queryset()), request))
+
+    def get_version_stamp(self):
+        stamp = self._my_jams().aggregate(n=Count('pk'), modified=Max('updated_at'))
+        return (self.request.user.pk, stamp['n'], stamp['modified']), None
+
+    def _my_jams(self):
         user = self.request.user
-        return JamSession.objects.filter(
-            Q(created_by=user) | Q(participation__user=user)
-        ).distinct().order_by('date_time')
+        # A subquery instead of a participation join keeps rows unique without
+        # DISTINCT, which would otherwise have to compare the annotations too.
+        joined = Participation.objects.filter(user=user).values('jam_session')
+        return JamSession.objects.filter(Q(created_by=user) | Q(pk__in=joined))
 
 
 class ParticipationCreateView(generics.CreateAPIView):
@@ -106,12 +211,15 @@ class ParticipationCreateView(generics.CreateAPIView):
     permission_classes = [IsNotBanned]
 
     def perform_create(self, serializer):
-        jam = get_object_or_404(JamSession, pk=serializer.validated_data['jam_session'].id)
-        participant_count = jam.participation_set.count()
-        if participant_count >= jam.max_participants - 1:  # -1 reserves a spot for the organiser
-            raise ValidationError({'detail': 'This jam session is full.'})
+        jam = serializer.validated_data['jam_session']
         try:
-            participation = serializer.save(user=self.request.user)
+            with transaction.atomic():
+                # Claim the spot first: on Postgres the UPDATE row-locks the
+                # jam, so concurrent joins queue here instead of overfilling.
+                if not JamSession.objects.claim_spot(jam.pk):
+                    raise ValidationError({'detail': 'This jam session is full.'})
+                participation = serializer.save(user=self.request.user)
+                partners.record_join(jam, self.request.user)
         except IntegrityError:
             raise ValidationError({'detail': 'You have already joined this session.'})
         jam = participation.jam_session
@@ -128,38 +236,36 @@ class ParticipationCreateView(generics.CreateAPIView):
 
 
 class ParticipantListView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get(self, request, jam_pk):
-        from users.serializers import UserSerializer
-        jam = get_object_or_404(JamSession, pk=jam_pk)
+        from users.serializers import cached_user_data
+        jam = get_object_or_404(JamSession.objects.select_related('created_by'), pk=jam_pk)
         participations = Participation.objects.filter(
             jam_session=jam
-        ).select_related('user', 'user__profile')
+        ).select_related('user', 'user__profile').order_by('pk')
 
         if request.user.is_authenticated:
-            my_jam_ids = set(
-                JamSession.objects.filter(
-                    Q(created_by=request.user) | Q(participation__user=request.user)
-                ).values_list('id', flat=True)
+            participations = participations.annotate(shared_with_me=Subquery(
+                JamPartnership.objects.filter(
+                    user=request.user, partner_id=OuterRef('user_id'),
+                ).values('shared_jam_count')[:1]
+            ))
+
+        participations = list(participations)
+        # If the requester is in this jam too, it is one of the shared jams
+        # counted on the edge; "jammed before" needs another one.
+        i_am_member = jam.created_by_id == request.user.id or any(
+            p.user_id == request.user.id for p in participations
+        )
+        needed = 2 if i_am_member else 1
+        users = [p.user for p in participations]
+        participant_data = cached_user_data(users, request)
+        for p, user_data in zip(participations, participant_data):
+            user_data['jammed_before'] = (
+                (getattr(p, 'shared_with_me', None) or 0) >= needed and p.user_id != request.user.id
             )
-        else:
-            my_jam_ids = set()
-
-        participant_data = []
-        for p in participations:
-            user_data = UserSerializer(p.user, context={'request': request}).data
-            if request.user.is_authenticated and p.user != request.user:
-                their_jam_ids = set(
-                    JamSession.objects.filter(
-                        Q(created_by=p.user) | Q(participation__user=p.user)
-                    ).values_list('id', flat=True)
-                )
-                shared = (my_jam_ids & their_jam_ids) - {jam.id}
-                user_data['jammed_before'] = bool(shared)
-            else:
-                user_data['jammed_before'] = False
-            participant_data.append(user_data)
 
         return Response({
             'created_by': jam.created_by.username,
@@ -167,20 +273,55 @@ class ParticipantListView(APIView):
         })
 
 
+class JamPartnerListView(generics.ListAPIView):
+    """Musicians the requester has shared a jam with, most recent first."""
+    serializer_class = JamPartnerSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PartnerCursorPagination
+
+    def get_queryset(self):
+        return JamPartnership.objects.filter(user=self.request.user).select_related('partner')
+
+
 class LeaveJamView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request, jam_pk):
         try:
-            p = Participation.objects.get(user=request.user, jam_session_id=jam_pk)
-            p.delete()
-            return Response(status=204)
+            p = Participation.objects.select_related('jam_session').get(user=request.user, jam_session_id=jam_pk)
         except Participation.DoesNotExist:
             raise ValidationError({'detail': 'You have not joined this session.'})
+        with transaction.atomic():
+            # The post_delete signal gives the spot back.
+            p.delete()
+            partners.record_leave(p.jam_session, request.user)
+        return Response(status=204)
+
+
+def _get_jam_as_member(jam_pk, user, denied_message):
+    """Fetch the jam and check membership in a single query."""
+    jam = get_object_or_404(
+        JamSession.objects.annotate(
+            user_joined=Exists(Participation.objects.filter(jam_session=OuterRef('pk'), user=user))
+        ),
+        pk=jam_pk,
+    )
+    if jam.created_by_id != user.id and not jam.user_joined:
+        raise PermissionDenied(denied_message)
+    return jam
 
 
 class MessageListCreateView(generics.ListCreateAPIView):
+    """Chat history, newest page first.
+
+    Pass ``?after=<message id>`` to poll for new messages only: they come
+    back oldest first as a plain list, or as an empty 304 when nothing is
+    new. A full batch (``API_MAX_PAGE_SIZE`` messages) means there may be
+    more waiting.
+    """
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
+    authentication_classes = [ClaimsJWTAuthentication]
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -188,24 +329,38 @@ class MessageListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
     def get_queryset(self):
-        jam = get_object_or_404(JamSession, pk=self.kwargs['jam_pk'])
-        is_member = (
-            jam.created_by == self.request.user or
-            Participation.objects.filter(user=self.request.user, jam_session=jam).exists()
+        jam = _get_jam_as_member(
+            self.kwargs['jam_pk'], self.request.user,
+            'You must be a member of this session to read messages.',
+        )
+        return Message.objects.filter(jam_session=jam).select_related('sender')
+
+    def list(self, request, *args, **kwargs):
+        after = request.query_params.get('after')
+        if after is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            after = int(after)
+        except ValueError:
+            raise ValidationError({'after': 'Must be a message id.'})
+        messages = list(
+            self.get_queryset().filter(pk__gt=after).order_by('pk')[:settings.API_MAX_PAGE_SIZE]
         )
-        if not is_member:
-            raise PermissionDenied('You must be a member of this session to read messages.')
-        return Message.objects.filter(jam_session=jam)
+        if not messages:
+            return Response(status=304)
+        return Response(self.get_serializer(messages, many=True).data)
 
     def perform_create(self, serializer):
-        jam = get_object_or_404(JamSession, pk=self.kwargs['jam_pk'])
-        is_member = (
-            jam.created_by == self.request.user or
-            Participation.objects.filter(user=self.request.user, jam_session=jam).exists()
+        jam = _get_jam_as_member(
+            self.kwargs['jam_pk'], self.request.user,
+            'You must join this session to send messages.',
         )
-        if not is_member:
-            raise PermissionDenied('You must join this session to send messages.')
-        message = serializer.save(sender=self.request.user, jam_session=jam)
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user, jam_session=jam)
+            # last_message is part of the jam's payload.
+            JamSession.objects.filter(pk=jam.pk).touch()
+        payload = dict(serializer.data)
+        transaction.on_commit(lambda: get_broker().publish(jam_channel(jam.id), payload))
         participant_user_ids = list(
             jam.participation_set.values_list('user_id', flat=True)
         )
@@ -222,6 +377,133 @@ class MessageListCreateView(generics.ListCreateAPIView):
         )
 
 
+class StreamsBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many live chats are open. Poll the messages endpoint with ?after= instead.'
+    default_code = 'streams_busy'
+
+    def __init__(self):
+        super().__init__()
+        # DRF sends this as Retry-After.
+        self.wait = settings.CHAT_STREAM_TIMEOUT
+
+
+class _StreamSlots:
+    """Caps the SSE streams open in this process.
+
+    Each stream holds a worker thread for up to CHAT_STREAM_TIMEOUT, so
+    without a cap a handful of open chat screens would starve every other
+    request. Past CHAT_MAX_STREAMS the stream view answers 503.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= settings.CHAT_MAX_STREAMS:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = _StreamSlots()
+
+
+class _MessageEventStream:
+    """Iterable SSE body. Django calls close() when the client goes away,
+    which releases the broker subscription and the stream slot even if
+    iteration never began."""
+
+    def __init__(self, subscription, backlog):
+        self.subscription = subscription
+        self.backlog = backlog
+        self.closed = False
+
+    @staticmethod
+    def _event(message):
+        return f'id: {message["id"]}\nevent: message\ndata: {json.dumps(message)}\n\n'
+
+    def __iter__(self):
+        last_sent = 0
+        for message in self.backlog:
+            last_sent = message['id']
+            yield self._event(message)
+        deadline = time.monotonic() + settings.CHAT_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            message = self.subscription.get(timeout=settings.CHAT_STREAM_KEEPALIVE)
+            if message is None:
+                yield ': keepalive\n\n'
+            elif message['id'] > last_sent:
+                last_sent = message['id']
+                yield self._event(message)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.subscription.close()
+        finally:
+            stream_slots.release()
+
+
+class MessageStreamView(APIView):
+    """Server-Sent Events feed of new chat messages for one jam.
+
+    Members only, same as the message list. Each event's id is the message
+    id, so a reconnecting client sends Last-Event-ID (or ?after=) and first
+    receives whatever it missed. Streams end after CHAT_STREAM_TIMEOUT
+    seconds so clients reconnect and re-authenticate. Once CHAT_MAX_STREAMS
+    are open in this process, further clients get a 503 and should fall
+    back to polling ?after=.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, jam_pk):
+        jam = _get_jam_as_member(
+            jam_pk, request.user,
+            'You must be a member of this session to read messages.',
+        )
+        last_id = request.headers.get('Last-Event-ID') or request.query_params.get('after')
+        if last_id is not None:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                raise ValidationError({'after': 'Must be a message id.'})
+
+        if not stream_slots.acquire():
+            raise StreamsBusy()
+        # Subscribe before reading the backlog so nothing falls in between;
+        # duplicates are filtered by id while streaming.
+        subscription = get_broker().subscribe(jam_channel(jam.pk))
+        try:
+            backlog = []
+            if last_id is not None:
+                missed = (
+                    Message.objects.filter(jam_session=jam, pk__gt=last_id)
+                    .select_related('sender').order_by('pk')[:settings.API_MAX_PAGE_SIZE]
+                )
+                backlog = MessageSerializer(missed, many=True).data
+        except BaseException:
+            _MessageEventStream(subscription, []).close()
+            raise
+
+        response = StreamingHttpResponse(
+            _MessageEventStream(subscription, backlog),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class ReviewCreateView(APIView):
     permission_classes = [IsNotBanned]
 
@@ -261,7 +543,11 @@ class ReviewCreateView(APIView):
         serializer = ReviewSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         try:
-            serializer.save(reviewer=request.user, jam_session=jam)
+            with transaction.atomic():
+                review = serializer.save(reviewer=request.user, jam_session=jam)
+                UserProfile.adjust_trust_stats(
+                    review.reviewee_id, review.showed_up, review.would_jam_again,
+                )
         except IntegrityError:
             return Response({'detail': 'You have already reviewed this person for this jam.'}, status=400)
 
@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def claims_user(**claims):
+    """A User built from access-token claims without touching the database.
+
+    Only the claimed fields are set; the first access to any other field
+    loads the rest of the row in one query. Being a plain User instance, it
+    compares equal to the stored one and works in queryset filters, with no
+    model or migration of its own.
+    """
+    names = [f.attname for f in User._meta.concrete_fields]
+    user = User.from_db(None, names, [claims.get(name, DEFERRED) for name in names])
+    load_field = user.refresh_from_db
+
+    def load_deferred(using=None, fields=None, from_queryset=None):
+        # Deferred attribute access loads one field at a time; take them all.
+        deferred = user.get_deferred_fields()
+        if fields is not None and deferred:
+            fields = set(fields) | deferred
+        load_field(using, fields, from_queryset)
+
+    user.refresh_from_db = load_deferred
+    return user
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token that also carries the username; access tokens made from
+    it (including on refresh) copy the claim."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        return token
+
+
+class LoginSerializer(TokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that fetches the user's profile in the same query,
+    so IsNotBanned and views reading request.user.profile don't run another."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = (
+            User.objects.select_related('profile')
+            .filter(**{api_settings.USER_ID_FIELD: user_id})
+            .first()
+        )
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+class ClaimsJWTAuthentication(ProfileJWTAuthentication):
+    """For read endpoints. On GET/HEAD/OPTIONS request.user is a User
+    built from the token's id and username claims (claims_user()), so authenticating costs
+    no query; writes go through ProfileJWTAuthentication as usual.
+
+    Reads therefore don't notice a deactivated or deleted account until its
+    access token expires. Ban checks only guard writes, which still load
+    the profile.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_claims_user(validated_token), validated_token
+
+    def get_claims_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+        claims = {api_settings.USER_ID_FIELD: user_id}
+        # Tokens issued before the claim was added load it on first use.
+        if 'username' in validated_token:
+            claims['username'] = validated_token['username']
+        return claims_user(**claims)
@@ -1,8 +1,161 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+"""Google ID-token verification against locally cached signing keys.
+
+Google publishes the keys it signs ID tokens with as a JWK set and says
+how long to keep them (Cache-Control max-age). The set is stored in the
+default cache, so it is shared by every worker when CACHE_URL points at a
+shared cache. Once max-age has passed, the next verification still uses
+the cached keys and starts a refresh in the background. One worker
+refreshes at a time, guarded by a short lock in the cache; the same lock
+lets a single request fill a cold cache while the others wait for it. A
+token signed with a key we haven't seen yet triggers one synchronous
+refresh, because Google rotates keys every few days, but no more than once
+per MIN_REFRESH_INTERVAL: made-up key ids can't make every request call
+Google.
+"""
+import logging
+import re
+import threading
+import time
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.http import get_client
+
+from .exceptions import ProviderUnavailable
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+JWKS_CACHE_KEY = 'google-jwks'
+REFRESH_LOCK_KEY = 'google-jwks:refreshing'
+REFRESH_LOCK_TIMEOUT = 30           # seconds
+# How long past max-age the old keys may still be served while a refresh
+# is under way.
+STALE_GRACE = 3600                  # seconds
+# Keys younger than this are not refetched for an unknown key id.
+MIN_REFRESH_INTERVAL = 60           # seconds
+# How often a request waiting on another's cold-cache fetch rechecks.
+FILL_POLL_INTERVAL = 0.05           # seconds
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleKeySet:
+    def __init__(self, url=None):
+        self.url = url
+        self._thread = None
+
+    def get_key(self, kid):
+        entry = self._cached_entry()
+        keys = entry['keys']
+        if (
+            kid not in keys
+            and time.time() - entry.get('fetched_at', 0) >= MIN_REFRESH_INTERVAL
+            and cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT)
+        ):
+            try:
+                keys = self.refresh()['keys']
+            finally:
+                cache.delete(REFRESH_LOCK_KEY)
+        if kid not in keys:
+            raise jwt.InvalidTokenError('Token is signed with an unknown key.')
+        try:
+            return jwt.PyJWK(keys[kid]).key
+        except jwt.PyJWKError as e:
+            raise jwt.InvalidTokenError('Token is signed with an unusable key.') from e
+
+    def _cached_keys(self):
+        return self._cached_entry()['keys']
+
+    def _cached_entry(self):
+        entry = cache.get(JWKS_CACHE_KEY)
+        if entry is None:
+            return self._fill()
+        if time.time() >= entry['refresh_at']:
+            self.refresh_in_background()
+        return entry
+
+    def _fill(self):
+        """Fetch into an empty cache, once across concurrent requests."""
+        if cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+            try:
+                return self.refresh()
+            finally:
+                cache.delete(REFRESH_LOCK_KEY)
+        # Someone else is fetching: wait for their result, up to as long as
+        # their fetch may take, then try ourselves.
+        deadline = time.monotonic() + settings.OUTBOUND_HTTP_CONNECT_TIMEOUT + settings.OUTBOUND_HTTP_READ_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(FILL_POLL_INTERVAL)
+            entry = cache.get(JWKS_CACHE_KEY)
+            if entry is not None:
+                return entry
+            if cache.get(REFRESH_LOCK_KEY) is None:
+                break
+        return self.refresh()
+
+    def refresh(self):
+        """Fetch the current key set, cache it, and return the cache entry
+        ('keys' maps kid -> JWK).
+
+        Raises ProviderUnavailable if Google can't be reached or answers
+        with something that isn't a key set.
+        """
+        try:
+            resp = get_client().get(self.url or settings.GOOGLE_CERTS_URL, name='google-certs')
+            resp.raise_for_status()
+            keys = {jwk['kid']: jwk for jwk in resp.json()['keys']}
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            logger.warning('Fetching Google signing keys failed: %s', type(e).__name__)
+            raise ProviderUnavailable()
+        match = _MAX_AGE_RE.search(resp.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else settings.GOOGLE_CERTS_DEFAULT_TTL
+        now = time.time()
+        entry = {'keys': keys, 'fetched_at': now, 'refresh_at': now + max_age}
+        cache.set(JWKS_CACHE_KEY, entry, timeout=max_age + STALE_GRACE)
+        return entry
+
+    def refresh_in_background(self):
+        if not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+            return
+        self._thread = threading.Thread(target=self._background_refresh, name='google-jwks', daemon=True)
+        self._thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.warning('Refreshing Google signing keys failed', exc_info=True)
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+
+
+_key_set = None
+_key_set_lock = threading.Lock()
+
+
+def get_key_set():
+    global _key_set
+    if _key_set is None:
+        with _key_set_lock:
+            if _key_set is None:
+                _key_set = GoogleKeySet()
+    return _key_set
 
 
 def verify_google_token(token, client_id):
-    request = google_requests.Request()
-    payload = id_token.verify_oauth2_token(token, request, client_id)
-    return payload
+    """Check a Google ID token's signature, audience, issuer and expiry
+    locally and return its claims.
+
+    Raises jwt.InvalidTokenError for a bad token, and ProviderUnavailable
+    if the keys had to be fetched and couldn't be.
+    """
+    kid = jwt.get_unverified_header(token).get('kid')
+    return jwt.decode(
+        token, get_key_set().get_key(kid), algorithms=['RS256'],
+        audience=client_id, issuer=GOOGLE_ISSUERS,
+        options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']},
+    )
@@ -0,0 +1,112 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from utils.perf import RequestMetrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure registration, login and account-update throughput and queries per '
+        'request. Runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument(
+            '--colliding', type=int, default=10_000,
+            help='Existing usernames sharing one base when timing social sign-up username allocation.',
+        )
+        parser.add_argument(
+            '--real-hashing', action='store_true',
+            help='Keep the configured password hasher. By default a fast one is used so '
+                 'database work is not drowned out by key stretching.',
+        )
+
+    def handle(self, *args, **options):
+        hashers = None if options['real_hashing'] else ['django.contrib.auth.hashers.MD5PasswordHasher']
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if hashers:
+            overrides['PASSWORD_HASHERS'] = hashers
+        n = options['count']
+        clients = {}
+
+        def register(i):
+            return APIClient().post('/api/users/register/', {
+                'username': f'authbench{i}', 'email': f'authbench{i}@example.com',
+                'password': 'pw-bench-123', 'password2': 'pw-bench-123',
+                'instruments': 'Guitar',
+            }, format='json', REMOTE_ADDR=self._ip(i))
+
+        def login(i):
+            return APIClient().post('/api/users/login/', {
+                'username': f'authbench{i}', 'password': 'pw-bench-123',
+            }, format='json', REMOTE_ADDR=self._ip(i))
+
+        def change_email(i):
+            return clients[i].post('/api/users/change-email/', {
+                'password': 'pw-bench-123', 'new_email': f'authbench{i}@example.org',
+            }, format='json')
+
+        def change_password(i):
+            return clients[i].post('/api/users/change-password/', {
+                'current_password': 'pw-bench-123', 'new_password': 'pw-bench-456',
+            }, format='json')
+
+        with override_settings(**overrides), transaction.atomic():
+            self.stdout.write(f'{"operation":<16} {"req/s":>8} {"p50 ms":>8} {"queries":>8}')
+            self._report('register', register, n)
+            self._report('login', login, n)
+            for user in User.objects.filter(username__startswith='authbench'):
+                client = clients[int(user.username.removeprefix('authbench'))] = APIClient()
+                client.force_authenticate(user)
+            self._report('change_email', change_email, n)
+            self._report('change_password', change_password, n)
+            self._report_username_allocation(options['colliding'], n)
+            transaction.set_rollback(True)
+
+    def _report(self, name, op, n):
+        samples, queries = [], []
+        for i in range(n):
+            metrics = RequestMetrics()
+            with connection.execute_wrapper(metrics):
+                start = time.perf_counter()
+                response = op(i)
+                samples.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                self.stderr.write(f'{name} #{i} failed: {response.status_code} {response.data}')
+                return
+            queries.append(metrics.queries)
+        self.stdout.write(
+            f'{name:<16} {n / sum(samples):>8.1f} {statistics.median(samples) * 1000:>8.2f} '
+            f'{statistics.median(queries):>8}'
+        )
+
+    def _report_username_allocation(self, colliding, n):
+        from users.views import _unique_username
+        # 'jammer', 'jammer1' ... 'jammer<colliding - 1>' are all taken.
+        User.objects.bulk_create(
+            [User(username='jammer' + (str(i) if i else '')) for i in range(colliding)], batch_size=1000,
+        )
+        samples, queries = [], []
+        for _ in range(min(n, 50)):
+            metrics = RequestMetrics()
+            with connection.execute_wrapper(metrics):
+                start = time.perf_counter()
+                _unique_username('jammer')
+                samples.append(time.perf_counter() - start)
+            queries.append(metrics.queries)
+        self.stdout.write(
+            f'{"username@" + str(colliding):<16} {len(samples) / sum(samples):>8.1f} '
+            f'{statistics.median(samples) * 1000:>8.2f} {statistics.median(queries):>8}'
+        )
+
+    @staticmethod
+    def _ip(i):
+        # A fresh client address per request keeps the per-IP throttles out of the way.
+        return f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users import tags
+
+
+class Command(BaseCommand):
+    help = "Recreate every profile's instrument and genre tags from its text fields."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            n = tags.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Tagged profiles with {n} instrument and genre links.'))
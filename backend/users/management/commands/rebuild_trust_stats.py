@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+from jams.models import Review
+from users.models import UserProfile
+
+
+def trust_stat_counts(review_model):
+    """Correlated subqueries counting each profile's received reviews."""
+    def count(condition=Q()):
+        received = (
+            review_model.objects.filter(condition, reviewee_id=OuterRef('user_id'))
+            .order_by().values('reviewee_id').annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(received, output_field=IntegerField()), Value(0))
+
+    return {
+        'reviews_received_count': count(),
+        'showed_up_count': count(Q(showed_up=True)),
+        'would_jam_again_count': count(Q(would_jam_again=True)),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalised review counters on every UserProfile.'
+
+    def handle(self, *args, **options):
+        updated = UserProfile.objects.update(**trust_stat_counts(Review), updated_at=Now())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trust stats for {updated} profiles.'))
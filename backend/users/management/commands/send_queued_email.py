@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from users.models import OutboundEmail
+from users.outbox import EmailSender
+
+
+class Command(BaseCommand):
+    help = 'Send every due message in the email outbox over one connection, then exit.'
+
+    def handle(self, *args, **options):
+        sender = EmailSender()
+        claimed = 0
+        try:
+            while n := sender.deliver_pending():
+                claimed += n
+        finally:
+            sender.close()
+        pending = OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count()
+        self.stdout.write(self.style.SUCCESS(f'Attempted {claimed} messages; {pending} still pending.'))
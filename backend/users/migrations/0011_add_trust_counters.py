@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:05
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_trust_stats(apps, schema_editor):
+    # The counting rebuild_trust_stats did when this was written, kept here
+    # so later changes to the command don't alter this migration.
+    UserProfile = apps.get_model('users', 'UserProfile')
+    Review = apps.get_model('jams', 'Review')
+
+    def count(condition=Q()):
+        received = (
+            Review.objects.filter(condition, reviewee_id=OuterRef('user_id'))
+            .order_by().values('reviewee_id').annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(received, output_field=IntegerField()), Value(0))
+
+    UserProfile.objects.update(
+        reviews_received_count=count(),
+        showed_up_count=count(Q(showed_up=True)),
+        would_jam_again_count=count(Q(would_jam_again=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_add_expo_push_token'),
+        ('jams', '0003_add_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='reviews_received_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='showed_up_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='would_jam_again_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_trust_stats, migrations.RunPython.noop),
+    ]
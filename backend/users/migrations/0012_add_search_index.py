@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# users.models.MUSICIAN_SEARCH_INDEX and its utils.search DDL as they were
+# when this was written, copied so later changes to those modules don't
+# alter this migration.
+INDEX_NAME = 'users_userprofile_search'
+TABLE = 'users_userprofile'
+KEY_COLUMN = 'user_id'
+
+
+def documents(apps, using):
+    profiles = apps.get_model('users', 'UserProfile').objects.using(using).select_related('user').order_by('pk')
+    return [
+        [profile.user_id, ' '.join([profile.user.username, profile.instruments, profile.genres])]
+        for profile in profiles.iterator(chunk_size=1000)
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    rows = documents(apps, connection.alias)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_NAME}_fts "
+                f"USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f'DELETE FROM {INDEX_NAME}_fts')
+            cursor.executemany(f'INSERT INTO {INDEX_NAME}_fts (rowid, body) VALUES (%s, %s)', rows)
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME}_search_gin ON {TABLE} USING GIN (search_vector)')
+            cursor.executemany(
+                f"UPDATE {TABLE} SET search_vector = to_tsvector('simple', %s) WHERE {KEY_COLUMN} = %s",
+                [[text, key] for key, text in rows],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {INDEX_NAME}_fts')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}_search_gin')
+            cursor.execute(f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_add_trust_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def parse(text):
+    # users.tags.parse() as it was when this was written.
+    names = {' '.join(part.split()).lower()[:50].strip() for part in (text or '').split(',')}
+    names.discard('')
+    return names
+
+
+def backfill_tags(apps, schema_editor):
+    # users.tags.rebuild() as it was when this was written, kept here so
+    # later changes to that module don't alter this migration.
+    profiles = apps.get_model('users', 'UserProfile').objects.order_by()
+    for text_field, tag_name, through_name, tag_fk in [
+        ('instruments', 'Instrument', 'ProfileInstrument', 'instrument'),
+        ('genres', 'Genre', 'ProfileGenre', 'genre'),
+    ]:
+        Tag, Through = apps.get_model('users', tag_name), apps.get_model('users', through_name)
+        parsed = [(pk, parse(text)) for pk, text in profiles.values_list('pk', text_field).iterator()]
+        names = sorted({name for _, tags in parsed for name in tags})
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+        Through.objects.bulk_create(
+            [Through(profile_id=pk, **{f'{tag_fk}_id': ids[name]}) for pk, tags in parsed for name in tags],
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_add_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileGenre',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.genre')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.userprofile')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='genre_tags',
+            field=models.ManyToManyField(blank=True, related_name='profiles', through='users.ProfileGenre', to='users.genre'),
+        ),
+        migrations.CreateModel(
+            name='ProfileInstrument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.instrument')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.userprofile')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='instrument_tags',
+            field=models.ManyToManyField(blank=True, related_name='profiles', through='users.ProfileInstrument', to='users.instrument'),
+        ),
+        migrations.AddIndex(
+            model_name='profilegenre',
+            index=models.Index(fields=['genre', 'profile'], name='profilegenre_tag_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='profilegenre',
+            unique_together={('profile', 'genre')},
+        ),
+        migrations.AddIndex(
+            model_name='profileinstrument',
+            index=models.Index(fields=['instrument', 'profile'], name='profileinstrument_tag_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='profileinstrument',
+            unique_together={('profile', 'instrument')},
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,25 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
 from django.contrib.auth.models import User
+from utils.cache import RepresentationCache
+from utils.search import SearchIndex
+
+
+class Instrument(models.Model):
+    # Normalised by users.tags.parse(): lower case, single spaces.
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Genre(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
 
 
 class UserProfile(models.Model):
@@ -24,10 +44,76 @@ class UserProfile(models.Model):
     strike_count = models.PositiveIntegerField(default=0)
     is_banned = models.BooleanField(default=False)
     expo_push_token = models.CharField(max_length=200, blank=True)
+    # Denormalised from Review so trust stats cost no queries to serialise.
+    # Kept current by adjust_trust_stats(); rebuild with `manage.py rebuild_trust_stats`.
+    reviews_received_count = models.PositiveIntegerField(default=0)
+    showed_up_count = models.PositiveIntegerField(default=0)
+    would_jam_again_count = models.PositiveIntegerField(default=0)
+    # Version stamp for conditional GETs of the public profile.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Parsed from instruments/genres above, which stay the editable text;
+    # kept in step by users.signals, rebuilt with `manage.py rebuild_profile_tags`.
+    instrument_tags = models.ManyToManyField(
+        Instrument, through='ProfileInstrument', blank=True, related_name='profiles',
+    )
+    genre_tags = models.ManyToManyField(Genre, through='ProfileGenre', blank=True, related_name='profiles')
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The text as loaded, so saves that leave it alone skip re-indexing
+        # and re-tagging (users.signals.index_profile).
+        instance._indexed_text = (instance.__dict__.get('instruments'), instance.__dict__.get('genres'))
+        return instance
+
+    @classmethod
+    def adjust_trust_stats(cls, user_id, showed_up, would_jam_again, delta=1):
+        """Add (or with delta=-1, remove) one review's worth of trust stats."""
+        cls.objects.filter(user_id=user_id).update(
+            reviews_received_count=F('reviews_received_count') + delta,
+            showed_up_count=F('showed_up_count') + (delta if showed_up else 0),
+            would_jam_again_count=F('would_jam_again_count') + (delta if would_jam_again else 0),
+            updated_at=Now(),
+        )
+
+
+class ProfileInstrument(models.Model):
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE)
+
+    class Meta:
+        # The unique index serves a profile's own tags; the reverse one the
+        # directory filter, which looks profiles up by tag.
+        unique_together = ('profile', 'instrument')
+        indexes = [
+            models.Index(fields=['instrument', 'profile'], name='profileinstrument_tag_idx'),
+        ]
+
+
+class ProfileGenre(models.Model):
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('profile', 'genre')
+        indexes = [
+            models.Index(fields=['genre', 'profile'], name='profilegenre_tag_idx'),
+        ]
+
+
+MUSICIAN_SEARCH_INDEX = SearchIndex(
+    name='users_userprofile_search',
+    table='users_userprofile',
+    key_column='user_id',
+    document=lambda profile: ' '.join([profile.user.username, profile.instruments, profile.genres]),
+)
+
+# Serialized User + profile (UserSerializer), keyed by the profile's updated_at.
+USER_CACHE = RepresentationCache('user', version=lambda user: user.profile.updated_at)
+
 
 class PhoneOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='phone_otps')
@@ -47,3 +133,29 @@ class PasswordResetOTP(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+
+class OutboundEmail(models.Model):
+    """A message waiting in the email outbox (see users/outbox.py)."""
+    PENDING, SENT, FAILED = 'pending', 'sent', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Earliest time the next attempt may start; also the lease of a sender
+    # that has claimed the row.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outboundemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.to} ({self.status})'
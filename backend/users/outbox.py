@@ -0,0 +1,144 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Rows claimed per round trip to the outbox table.
+BATCH_SIZE = 50
+# How long a claimed row is left alone before another sender may retry it,
+# e.g. because the worker that claimed it died mid-send.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+class EmailSender:
+    """Drains the email outbox from a background thread.
+
+    queue_email() writes a row in the caller's transaction and wakes the
+    sender once that commits. Messages go out over one SMTP connection that
+    is kept open while mail keeps coming and closed once the outbox has been
+    idle for a poll interval. Failed sends are retried with exponential
+    backoff up to EMAIL_OUTBOX_MAX_ATTEMPTS, then marked failed. The same
+    poll picks up retries and rows left behind by other processes.
+    """
+
+    def __init__(self, max_attempts=None, backoff=None, poll_interval=None):
+        self.max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.backoff = settings.EMAIL_OUTBOX_RETRY_BACKOFF if backoff is None else backoff
+        self.poll_interval = settings.EMAIL_OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.mail_connection = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        self._wake.set()
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._wake.wait(self.poll_interval):
+                self.close()
+            self._wake.clear()
+            try:
+                while self.deliver_pending():
+                    pass
+            except Exception:
+                logger.exception('Email outbox delivery failed')
+            finally:
+                # Don't hold a DB connection open between polls.
+                connection.close()
+
+    def deliver_pending(self):
+        """Claim and send one batch of due messages. Returns how many were claimed."""
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboundEmail.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+                .order_by('pk')[:BATCH_SIZE]
+            )
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                attempts=F('attempts') + 1, next_attempt_at=now + CLAIM_LEASE,
+            )
+
+        sent = []
+        for email in batch:
+            try:
+                self._send(email)
+            except Exception as e:
+                self._failed(email, e)
+            else:
+                sent.append(email.pk)
+        if sent:
+            OutboundEmail.objects.filter(pk__in=sent).update(
+                status=OutboundEmail.SENT, sent_at=timezone.now(), last_error='',
+            )
+        return len(batch)
+
+    def _send(self, email):
+        if self.mail_connection is None:
+            self.mail_connection = get_connection(fail_silently=False)
+            self.mail_connection.open()
+        message = EmailMessage(email.subject, email.body, to=[email.to], connection=self.mail_connection)
+        try:
+            message.send()
+        except Exception:
+            # The connection may be the problem; start the next send on a fresh one.
+            self.close()
+            raise
+
+    def _failed(self, email, error):
+        attempts = email.attempts + 1
+        if attempts >= self.max_attempts:
+            logger.error('Giving up on email %d to %s: %s', email.pk, email.to, error)
+            changes = {'status': OutboundEmail.FAILED}
+        else:
+            logger.warning('Email %d to %s failed (attempt %d): %s', email.pk, email.to, attempts, error)
+            changes = {'next_attempt_at': timezone.now() + timedelta(seconds=self.backoff * 2 ** (attempts - 1))}
+        OutboundEmail.objects.filter(pk=email.pk).update(last_error=str(error)[:1000], **changes)
+
+    def close(self):
+        if self.mail_connection is not None:
+            try:
+                self.mail_connection.close()
+            except Exception:
+                logger.warning('Error closing the mail connection', exc_info=True)
+            self.mail_connection = None
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = EmailSender()
+    return _sender
+
+
+def queue_email(to, subject, body):
+    """Add a message to the outbox. It is sent in the background once the
+    surrounding transaction commits, and never if it rolls back."""
+    email = OutboundEmail.objects.create(to=to, subject=subject, body=body)
+    transaction.on_commit(lambda: get_sender().wake(), robust=True)
+    return email
@@ -1,9 +1,10 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import UserProfile
+from utils.perf import TimedSerializerMixin
+from .models import USER_CACHE, UserProfile
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     completeness_score = serializers.SerializerMethodField()
     missing_fields = serializers.SerializerMethodField()
     phone_verified = serializers.SerializerMethodField()
@@ -60,7 +61,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         }
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password2 = serializers.CharField(write_only=True)
     instruments = serializers.CharField(required=False, allow_blank=True)
@@ -94,7 +95,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     avatar = serializers.SerializerMethodField()
     trust_stats = serializers.SerializerMethodField()
@@ -109,18 +110,26 @@ class UserSerializer(serializers.ModelSerializer):
         return profile.avatar_url or None
 
     def get_trust_stats(self, obj):
-        from jams.models import Review
-        received = Review.objects.filter(reviewee=obj)
-        total = received.count()
+        profile = getattr(obj, 'profile', None)
+        total = profile.reviews_received_count if profile else 0
         if total == 0:
             return {'successful_jams': 0, 'would_jam_again_pct': None}
-        showed_up = received.filter(showed_up=True).count()
-        would_again = received.filter(would_jam_again=True).count()
         return {
-            'successful_jams': showed_up,
-            'would_jam_again_pct': round(would_again / total * 100),
+            'successful_jams': profile.showed_up_count,
+            'would_jam_again_pct': round(profile.would_jam_again_count / total * 100),
         }
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'avatar', 'profile', 'trust_stats']
+
+
+def cached_user_data(users, request):
+    """UserSerializer output for `users` (with profiles loaded), via USER_CACHE."""
+    # Avatar URLs are absolute, so entries are per host.
+    variant = request.build_absolute_uri('/') if request else ''
+    return USER_CACHE.get_many(
+        users,
+        lambda missing: UserSerializer(missing, many=True, context={'request': request}).data,
+        variant=variant,
+    )
@@ -1,7 +1,26 @@
-from django.db.models.signals import post_save
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_init, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import UserProfile
+from utils import search
+from . import tags
+from .models import MUSICIAN_SEARCH_INDEX, UserProfile
+
+# User fields that show up in a profile's payload (UserSerializer) or its
+# search document.
+PROFILE_USER_FIELDS = ('username', 'email')
+
+
+def _profile_user_values(user):
+    # Deferred fields are missing from __dict__ and come out as None.
+    return {name: user.__dict__.get(name) for name in PROFILE_USER_FIELDS}
+
+
+@receiver(post_init, sender=User)
+def remember_profile_user_values(sender, instance, **kwargs):
+    # What the row said when loaded, so sync_user_profile can tell whether a
+    # save changed anything the profile shows.
+    instance._profile_user_values = _profile_user_values(instance)
 
 
 @receiver(post_save, sender=User)
@@ -11,5 +30,44 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def sync_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the profile's version stamp and search document in step with the
+    User fields they include. Saves that leave username and email as they
+    were loaded (last_login, password, full admin saves) don't touch the
+    profile at all."""
+    loaded = instance._profile_user_values
+    current = instance._profile_user_values = _profile_user_values(instance)
+    if created:
+        return
+    saved = PROFILE_USER_FIELDS if update_fields is None else set(PROFILE_USER_FIELDS) & set(update_fields)
+    changed = {name for name in saved if current[name] != loaded[name]}
+    if not changed:
+        return
+    UserProfile.objects.filter(user=instance).update(updated_at=Now())
+    if 'username' in changed:
+        try:
+            profile = instance.profile
+        except UserProfile.DoesNotExist:
+            return
+        search.update_document(MUSICIAN_SEARCH_INDEX, profile, key=instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def index_profile(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the search document and the instrument/genre tags in step with
+    the profile's text. Saves that leave the text as it was loaded skip both."""
+    if update_fields and not {'instruments', 'genres'} & set(update_fields):
+        return
+    text = (instance.instruments, instance.genres)
+    if not created and text == getattr(instance, '_indexed_text', None):
+        return
+    # New profiles are indexed even when empty, so the username is searchable.
+    search.update_document(MUSICIAN_SEARCH_INDEX, instance, key=instance.user_id)
+    if text != ('', '') or not created:
+        tags.sync(instance)
+    instance._indexed_text = text
+
+
+@receiver(post_delete, sender=UserProfile)
+def unindex_profile(sender, instance, **kwargs):
+    search.remove_document(MUSICIAN_SEARCH_INDEX, instance.user_id)
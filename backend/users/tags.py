@@ -0,0 +1,65 @@
+"""Instrument and genre tags parsed from a profile's comma-separated text.
+
+UserProfile.instruments and .genres stay the text musicians edit; the tag
+tables mirror them so the directory can filter with an indexed join on
+whole tags instead of a substring scan ("bass" no longer matches
+"bassoon"). sync() keeps one profile current and rebuild() redoes every
+profile in bulk.
+"""
+from django.apps import apps
+from django.db.models import Count
+
+MAX_LENGTH = 50
+
+# (text field on UserProfile, its M2M field, tag model, through model, through FK to the tag)
+DIMENSIONS = [
+    ('instruments', 'instrument_tags', 'Instrument', 'ProfileInstrument', 'instrument'),
+    ('genres', 'genre_tags', 'Genre', 'ProfileGenre', 'genre'),
+]
+
+
+def parse(text):
+    """'Bass, vocals,  Double  bass,bass' -> ['bass', 'double bass', 'vocals']"""
+    names = {' '.join(part.split()).lower()[:MAX_LENGTH].strip() for part in (text or '').split(',')}
+    names.discard('')
+    return sorted(names)
+
+
+def _tag_ids(tag_model, names):
+    if not names:
+        return {}
+    tag_model.objects.bulk_create([tag_model(name=name) for name in names], ignore_conflicts=True)
+    return dict(tag_model.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def sync(profile):
+    """Point the profile's tags at what its text fields currently say."""
+    for text_field, m2m_field, tag_model, _, _ in DIMENSIONS:
+        ids = _tag_ids(apps.get_model('users', tag_model), parse(getattr(profile, text_field)))
+        getattr(profile, m2m_field).set(ids.values())
+
+
+def rebuild(batch_size=5000):
+    """Recreate every profile's tags from its text fields."""
+    profiles = apps.get_model('users', 'UserProfile').objects.all()
+    total = 0
+    for text_field, _, tag_name, through_name, tag_fk in DIMENSIONS:
+        tag_model, through_model = apps.get_model('users', tag_name), apps.get_model('users', through_name)
+        parsed = [(pk, parse(text)) for pk, text in profiles.values_list('pk', text_field).iterator()]
+        ids = _tag_ids(tag_model, sorted({name for _, names in parsed for name in names}))
+        through_model.objects.all().delete()
+        rows = [
+            through_model(profile_id=pk, **{f'{tag_fk}_id': ids[name]})
+            for pk, names in parsed for name in names
+        ]
+        through_model.objects.bulk_create(rows, batch_size=batch_size)
+        total += len(rows)
+    return total
+
+
+def tagged_profiles(through_name, tag_fk, names, match_all=False):
+    """Subquery of the profile ids tagged with any (or all) of `names`."""
+    rows = apps.get_model('users', through_name).objects.filter(**{f'{tag_fk}__name__in': names})
+    if match_all:
+        rows = rows.values('profile_id').annotate(n=Count('pk')).filter(n=len(names))
+    return rows.values('profile_id')
@@ -1,3 +1,672 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from smtplib import SMTPServerDisconnected
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from jams.models import Participation, Review
+from . import google_auth, tags
+from .authentication import ProfileJWTAuthentication
+from .models import USER_CACHE, Instrument, OutboundEmail, ProfileInstrument, UserProfile
+from .outbox import EmailSender, queue_email
+from .views import _get_or_create_social_user, _unique_username
+
+
+class MusicianListTests(APITestCase):
+    def test_pages_by_username(self):
+        for name in ('carol', 'alice', 'bob', 'dave'):
+            User.objects.create_user(name, password='pw-123456')
+        first = self.client.get('/api/users/musicians/?page_size=3')
+        self.assertEqual([u['username'] for u in first.data['results']], ['alice', 'bob', 'carol'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([u['username'] for u in second.data['results']], ['dave'])
+        self.assertIsNone(second.data['next'])
+
+
+class TrustStatsTests(APITestCase):
+    def setUp(self):
+        from jams.tests import make_jam
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.guest = User.objects.create_user('guest', password='pw-123456')
+        self.jam = make_jam(self.host, date_time=timezone.now() - timedelta(days=1))
+        Participation.objects.create(user=self.guest, jam_session=self.jam)
+
+    def _review(self, reviewer, reviewee, showed_up=True, would_jam_again=True):
+        self.client.force_authenticate(reviewer)
+        return self.client.post(f'/api/jams/{self.jam.pk}/review/', {
+            'reviewee': reviewee.pk, 'jam_session': self.jam.pk,
+            'showed_up': showed_up, 'would_jam_again': would_jam_again,
+        })
+
+    def _stats(self, username):
+        return self.client.get(f'/api/users/users/{username}/').data['trust_stats']
+
+    def test_review_updates_counters(self):
+        self.assertEqual(self._review(self.host, self.guest, would_jam_again=False).status_code, 201)
+        self.assertEqual(self._review(self.guest, self.host).status_code, 201)
+        self.assertEqual(self._stats('guest'), {'successful_jams': 1, 'would_jam_again_pct': 0})
+        self.assertEqual(self._stats('host'), {'successful_jams': 1, 'would_jam_again_pct': 100})
+
+    def test_duplicate_review_does_not_count_twice(self):
+        self._review(self.host, self.guest)
+        self.assertEqual(self._review(self.host, self.guest).status_code, 400)
+        self.guest.profile.refresh_from_db()
+        self.assertEqual(self.guest.profile.reviews_received_count, 1)
+
+    def test_cascaded_review_delete_updates_counters(self):
+        self._review(self.host, self.guest)
+        self.jam.delete()
+        self.assertEqual(self._stats('guest'), {'successful_jams': 0, 'would_jam_again_pct': None})
+
+    def test_rebuild_command(self):
+        Review.objects.create(
+            reviewer=self.host, reviewee=self.guest, jam_session=self.jam,
+            showed_up=True, would_jam_again=False,
+        )
+        UserProfile.objects.filter(user=self.host).update(reviews_received_count=7)
+        call_command('rebuild_trust_stats', stdout=StringIO())
+        self.guest.profile.refresh_from_db()
+        self.host.profile.refresh_from_db()
+        self.assertEqual(
+            (self.guest.profile.reviews_received_count, self.guest.profile.showed_up_count,
+             self.guest.profile.would_jam_again_count),
+            (1, 1, 0),
+        )
+        self.assertEqual(self.host.profile.reviews_received_count, 0)
+
+    def test_musician_list_query_count_is_constant(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/musicians/')
+        for i in range(10):
+            User.objects.create_user(f'player{i}')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/musicians/')
+        self.assertEqual(len(response.data['results']), 12)
+
+
+class MusicianSearchTests(APITestCase):
+    def setUp(self):
+        for name, instruments, genres in [
+            ('bassist', 'bass, vocals', 'funk'),
+            ('woodwind', 'bassoon', 'classical'),
+            ('drummer', 'drums', 'rock, funk'),
+        ]:
+            user = User.objects.create_user(name)
+            user.profile.instruments = instruments
+            user.profile.genres = genres
+            user.profile.save()
+
+    def _usernames(self, q):
+        response = self.client.get('/api/users/musicians/', {'q': q})
+        return sorted(u['username'] for u in response.data['results'])
+
+    def test_searches_username_instruments_and_genres(self):
+        self.assertEqual(self._usernames('drum'), ['drummer'])
+        self.assertEqual(self._usernames('funk'), ['bassist', 'drummer'])
+        self.assertEqual(self._usernames('vocals funk'), ['bassist'])
+
+    def test_username_change_is_reindexed(self):
+        user = User.objects.get(username='drummer')
+        user.username = 'percussion'
+        user.save()
+        self.assertEqual(self._usernames('percussion'), ['percussion'])
+
+
+class PublicProfileConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.url = '/api/users/users/host/'
+
+    def _revalidate(self, response):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_profile_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            self.assertEqual(self._revalidate(first).status_code, 304)
+
+    def test_profile_edit_and_trust_stats_change_the_etag(self):
+        first = self.client.get(self.url)
+        self.client.force_authenticate(self.host)
+        self.client.patch('/api/users/me/', {'bio': 'Drummer'}, format='json')
+        second = self._revalidate(first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['profile']['bio'], 'Drummer')
+
+        UserProfile.adjust_trust_stats(self.host.id, showed_up=True, would_jam_again=True)
+        third = self._revalidate(second)
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.data['trust_stats']['successful_jams'], 1)
+
+    def test_unknown_profile_is_404(self):
+        self.assertEqual(self.client.get('/api/users/users/nobody/').status_code, 404)
+
+
+class UserCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user('host', password='pw-123456')
+        self.url = '/api/users/users/host/'
+
+    def test_repeat_reads_hit_the_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_profile_patch_invalidates(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(self.host)
+        self.client.patch('/api/users/me/', {'instruments': 'Drums'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['profile']['instruments'], 'Drums')
+        musicians = self.client.get('/api/users/musicians/')
+        self.assertEqual(musicians.data['results'][0]['profile']['instruments'], 'Drums')
+
+    def test_ban_invalidates(self):
+        self.client.get(self.url)
+        key = USER_CACHE.key(User.objects.select_related('profile').get(pk=self.host.pk))
+        profile = self.host.profile
+        profile.is_banned = True
+        profile.save()
+        self.assertNotEqual(USER_CACHE.key(User.objects.select_related('profile').get(pk=self.host.pk)), key)
+
+    def test_rebuilt_trust_stats_invalidate(self):
+        from jams.tests import make_jam
+        self.client.get(self.url)
+        guest = User.objects.create_user('guest', password='pw-123456')
+        Review.objects.create(
+            reviewer=guest, reviewee=self.host, jam_session=make_jam(guest),
+            showed_up=True, would_jam_again=True,
+        )
+        call_command('rebuild_trust_stats', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data['trust_stats']['successful_jams'], 1)
+
+
+class UserSaveTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user('host', email='host@example.com', password='pw-123456')
+        self.url = '/api/users/users/host/'
+
+    def test_password_and_login_saves_leave_the_profile_alone(self):
+        before = UserProfile.objects.get(user=self.host).updated_at
+        user = User.objects.get(pk=self.host.pk)
+        with self.assertNumQueries(1):
+            user.set_password('pw-654321')
+            user.save(update_fields=['password'])
+        with self.assertNumQueries(1):
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+        self.assertEqual(UserProfile.objects.get(user=self.host).updated_at, before)
+
+    def test_full_saves_without_changes_leave_the_profile_alone(self):
+        before = UserProfile.objects.get(user=self.host).updated_at
+        user = User.objects.get(pk=self.host.pk)
+        with self.assertNumQueries(1):
+            user.first_name = 'Host'
+            user.save()
+        self.assertEqual(UserProfile.objects.get(user=self.host).updated_at, before)
+        user.email = 'other@example.com'
+        user.save()
+        self.assertGreater(UserProfile.objects.get(user=self.host).updated_at, before)
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_email_change_invalidates_the_profile(self):
+        first = self.client.get(self.url)
+        self.client.force_authenticate(self.host)
+        response = self.client.post('/api/users/change-email/', {
+            'password': 'pw-123456', 'new_email': 'new@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['email'], 'new@example.com')
+
+    def test_rename_reindexes_search(self):
+        self.host.username = 'drummer'
+        self.host.save()
+        self.client.force_authenticate(self.host)
+        response = self.client.get('/api/users/musicians/?q=drummer')
+        self.assertEqual([u['username'] for u in response.data['results']], ['drummer'])
+
+
+class ProfileJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('host', password='pw-123456')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_user_and_profile_load_in_one_query(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.assertNumQueries(1):
+            user, _ = ProfileJWTAuthentication().authenticate(request)
+            self.assertFalse(user.profile.is_banned)
+
+    def test_banned_user_cannot_write(self):
+        UserProfile.objects.filter(user=self.user).update(is_banned=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = self.client.post('/api/jams/', {}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('suspended', response.data['detail'])
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    """locmem backend that counts connections and can be told to fail."""
+    opened = 0
+    failures = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+
+    def send_messages(self, messages):
+        if CountingEmailBackend.failures:
+            CountingEmailBackend.failures -= 1
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='users.tests.CountingEmailBackend')
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = CountingEmailBackend.failures = 0
+        self.user = User.objects.create_user('host', email='host@example.com', password='pw-123456')
+
+    def sender(self, **kwargs):
+        return EmailSender(backoff=0, **kwargs)
+
+    def test_otp_request_queues_mail_instead_of_sending(self):
+        self.user.profile.phone = '+31 6 12345678'
+        self.user.profile.save()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/users/phone/send-otp/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(mail.outbox, [])
+
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, OutboundEmail.PENDING)
+        self.assertIn(self.user.phone_otps.get().code, queued.body)
+
+        self.sender().deliver_pending()
+        self.assertEqual([m.to for m in mail.outbox], [['host@example.com']])
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+
+    def test_password_reset_for_unknown_email_queues_nothing(self):
+        self.client.post('/api/users/password/forgot/', {'email': 'nobody@example.com'})
+        self.client.post('/api/users/password/forgot/', {'email': 'host@example.com'})
+        self.assertEqual(list(OutboundEmail.objects.values_list('to', flat=True)), ['host@example.com'])
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hi', 'Hello')
+        # Savepoint, claim (select + update), release, mark sent.
+        with self.assertNumQueries(5):
+            self.assertEqual(self.sender().deliver_pending(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+
+    def test_failures_are_retried_then_given_up(self):
+        queue_email('host@example.com', 'Hi', 'Hello')
+        CountingEmailBackend.failures = 1
+        sender = self.sender(max_attempts=2)
+        with self.assertLogs('users.outbox', 'WARNING'):
+            sender.deliver_pending()
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.PENDING, 1))
+        self.assertIn('unexpectedly closed', email.last_error)
+
+        sender.deliver_pending()
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+        # The failed connection was dropped and a fresh one opened.
+        self.assertEqual(CountingEmailBackend.opened, 2)
+
+        queue_email('host@example.com', 'Hi', 'Hello')
+        CountingEmailBackend.failures = 2
+        with self.assertLogs('users.outbox', 'ERROR'):
+            sender.deliver_pending()
+            sender.deliver_pending()
+        self.assertEqual(OutboundEmail.objects.latest('pk').status, OutboundEmail.FAILED)
+
+    def test_claimed_rows_are_not_sent_twice(self):
+        queue_email('host@example.com', 'Hi', 'Hello')
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.sender().deliver_pending(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_command_drains_the_outbox(self):
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hi', 'Hello')
+        out = StringIO()
+        call_command('send_queued_email', stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('0 still pending', out.getvalue())
+
+
+class StubProvider:
+    """Local stand-in for the Google and Facebook endpoints the social login
+    views call. Speaks HTTP/1.1 keep-alive and records each request with the
+    client port it came from, so tests can see connection reuse."""
+
+    def __init__(self, delay=0, status=200, routes=None):
+        self.requests = []
+        self.delay = delay
+        self.routes = {
+            '/token': {'access_token': 'google-access'},
+            '/userinfo': {'email': 'gina@example.com', 'given_name': 'Gina'},
+            '/me': {'id': '42', 'name': 'Fay Book', 'email': 'fay@example.com'},
+        }
+        self.routes.update(routes or {})
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode()
+                stub.requests.append((self.command, self.path, body, self.client_address[1]))
+                time.sleep(stub.delay)
+                payload = json.dumps(stub.routes[self.path.split('?')[0]]).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Cache-Control', 'public, max-age=3600')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out and hung up
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def settings(self):
+        return override_settings(
+            GOOGLE_TOKEN_URL=f'{self.url}/token', GOOGLE_USERINFO_URL=f'{self.url}/userinfo',
+            FACEBOOK_GRAPH_URL=self.url, GOOGLE_CERTS_URL=f'{self.url}/certs',
+        )
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubProviderTestCase(APITestCase):
+    def start(self, **kwargs):
+        provider = StubProvider(**kwargs)
+        self.addCleanup(provider.stop)
+        overrides = provider.settings()
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        return provider
+
+
+class SocialLoginTests(StubProviderTestCase):
+    def test_google_code_exchange_reuses_one_connection(self):
+        provider = self.start()
+        response = self.client.post('/api/users/google-code/', {
+            'code': 'abc', 'redirectUri': 'app://redirect', 'codeVerifier': 'xyz',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertEqual([r[1] for r in provider.requests], ['/token', '/userinfo'])
+        self.assertIn('code_verifier=xyz', provider.requests[0][2])
+        self.assertEqual(len({r[3] for r in provider.requests}), 1)
+        self.assertTrue(User.objects.filter(email='gina@example.com', username='gina').exists())
+
+    def test_facebook_login(self):
+        provider = self.start()
+        response = self.client.post('/api/users/facebook/', {'access_token': 'fb&token'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token=fb%26token', provider.requests[0][1])
+        self.assertEqual(User.objects.get(email='fay@example.com').username, 'faybook')
+
+    def test_rejected_token_is_401(self):
+        self.start(status=401)
+        response = self.client.post('/api/users/google/', {'access_token': 'bad'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(OUTBOUND_HTTP_READ_TIMEOUT=0.2)
+    def test_slow_provider_times_out_with_503(self):
+        self.start(delay=1)
+        started = time.perf_counter()
+        with self.assertLogs('utils.http', 'WARNING'):
+            response = self.client.post('/api/users/google/', {'access_token': 'slow'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(time.perf_counter() - started, 1)
+
+
+def make_signing_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update(kid=kid, alg='RS256', use='sig')
+    return private_key, jwk
+
+
+@override_settings(GOOGLE_CLIENT_ID='test-client')
+class GoogleIdTokenTests(StubProviderTestCase):
+    def setUp(self):
+        cache.clear()
+        google_auth._key_set = None
+        self.key, jwk = make_signing_key('k1')
+        self.provider = self.start(routes={
+            '/certs': {'keys': [jwk]},
+            '/token': {'access_token': 'google-access', 'id_token': self.id_token()},
+        })
+
+    def id_token(self, key=None, kid='k1', **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': 'test-client', 'sub': '1234',
+            'iat': now, 'exp': now + 600, 'email': 'gina@example.com', 'email_verified': True,
+            'given_name': 'Gina',
+        }
+        payload.update(claims)
+        return jwt.encode(payload, key or self.key, algorithm='RS256', headers={'kid': kid})
+
+    def login(self, token):
+        return self.client.post('/api/users/google/', {'id_token': token}, format='json')
+
+    def paths(self):
+        return [r[1] for r in self.provider.requests]
+
+    def test_keys_are_fetched_once_and_reused(self):
+        self.assertEqual(self.login(self.id_token()).status_code, 200)
+        self.assertEqual(self.login(self.id_token()).status_code, 200)
+        self.assertEqual(self.paths(), ['/certs'])
+        self.assertTrue(User.objects.filter(email='gina@example.com', first_name='Gina').exists())
+
+    def test_code_exchange_skips_userinfo(self):
+        response = self.client.post('/api/users/google-code/', {
+            'code': 'abc', 'redirectUri': 'app://redirect',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.paths(), ['/token', '/certs'])
+
+    def test_rejects_bad_tokens(self):
+        other_key, _ = make_signing_key('k1')
+        for token in [
+            self.id_token(key=other_key),
+            self.id_token(aud='someone-else'),
+            self.id_token(iss='https://evil.example.com'),
+            self.id_token(exp=int(time.time()) - 60),
+            self.id_token(email_verified=False),
+            'not-a-jwt',
+        ]:
+            self.assertEqual(self.login(token).status_code, 401)
+
+    def age_keys(self, seconds):
+        entry = cache.get(google_auth.JWKS_CACHE_KEY)
+        cache.set(google_auth.JWKS_CACHE_KEY, dict(entry, fetched_at=entry['fetched_at'] - seconds))
+
+    def test_unknown_key_triggers_one_refetch(self):
+        self.login(self.id_token())
+        new_key, new_jwk = make_signing_key('k2')
+        self.provider.routes['/certs'] = {'keys': [new_jwk]}
+        self.age_keys(google_auth.MIN_REFRESH_INTERVAL)
+        self.assertEqual(self.login(self.id_token(key=new_key, kid='k2')).status_code, 200)
+        self.assertEqual(self.paths(), ['/certs', '/certs'])
+
+    def test_unknown_keys_on_fresh_keys_make_no_call(self):
+        self.login(self.id_token())
+        for kid in ['k2', 'k3', 'k4']:
+            self.assertEqual(self.login(self.id_token(kid=kid)).status_code, 401)
+        self.assertEqual(self.paths(), ['/certs'])
+
+    def test_unusable_key_is_a_401(self):
+        self.provider.routes['/certs'] = {'keys': [{'kid': 'k1', 'kty': 'RSA', 'n': 'AA', 'e': 'AQAB', 'alg': 'HS999'}]}
+        self.assertEqual(self.login(self.id_token()).status_code, 401)
+
+    def test_expired_key_set_refreshes_in_the_background(self):
+        self.login(self.id_token())
+        entry = cache.get(google_auth.JWKS_CACHE_KEY)
+        cache.set(google_auth.JWKS_CACHE_KEY, dict(entry, refresh_at=time.time() - 1))
+        new_key, new_jwk = make_signing_key('k2')
+        self.provider.routes['/certs'] = {'keys': [new_jwk]}
+
+        # Served from the old keys while the refresh runs.
+        self.assertEqual(self.login(self.id_token()).status_code, 200)
+        google_auth.get_key_set()._thread.join(timeout=5)
+        self.assertEqual(self.paths(), ['/certs', '/certs'])
+        self.assertEqual(set(cache.get(google_auth.JWKS_CACHE_KEY)['keys']), {'k2'})
+
+
+    def test_bad_key_set_response_is_a_503(self):
+        for body in [{'no-keys': []}, [1, 2], {'keys': [{'kty': 'RSA'}]}]:
+            cache.clear()
+            self.provider.routes['/certs'] = body
+            self.assertEqual(self.login(self.id_token()).status_code, 503)
+
+    def test_cold_cache_is_filled_once(self):
+        self.provider.delay = 0.3
+        key_set = google_auth.get_key_set()
+        results = []
+
+        def verify():
+            results.append(sorted(key_set._cached_keys()))
+
+        threads = [threading.Thread(target=verify) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertEqual(results, [['k1']] * 4)
+        self.assertEqual(self.paths(), ['/certs'])
+
+
+class UniqueUsernameTests(APITestCase):
+    def names(self, *usernames):
+        User.objects.bulk_create([User(username=u) for u in usernames])
+
+    def test_free_base_is_used_as_is(self):
+        self.names('johnny', 'john1')
+        self.assertEqual(_unique_username('john'), 'john')
+
+    def test_next_suffix_past_the_highest_taken(self):
+        self.names('john', 'john1', 'john9', 'john10', 'john007', 'johnny2', 'John11')
+        with self.assertNumQueries(1):
+            self.assertEqual(_unique_username('john'), 'john11')
+
+    def test_base_is_truncated_and_escaped(self):
+        self.names('a.b', 'axb1')
+        self.assertEqual(_unique_username('a.b'), 'a.b1')
+        self.assertEqual(len(_unique_username('x' * 40)), 28)
+
+    def test_oversized_suffix_is_ignored(self):
+        self.names('john', 'john5', 'john12345678901234567890')
+        self.assertEqual(_unique_username('john'), 'john6')
+        self.names('john' + '9' * 18)
+        self.assertEqual(_unique_username('john'), 'john1' + '0' * 18)
+
+    def test_social_sign_up_retries_a_name_taken_meanwhile(self):
+        self.names('gina')
+        with mock.patch('users.views._unique_username', side_effect=['gina', 'gina1']):
+            user, created = _get_or_create_social_user('gina@example.com', 'gina', first_name='Gina')
+        self.assertTrue(created)
+        self.assertEqual((user.username, user.first_name), ('gina1', 'Gina'))
+        self.assertEqual(_get_or_create_social_user('gina@example.com', 'gina'), (user, False))
+
+
+class MusicianTagTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for name, instruments, genres in [
+            ('bassist', 'Bass, vocals', 'funk'),
+            ('woodwind', 'bassoon', 'classical'),
+            ('drummer', 'drums, vocals', 'rock, funk'),
+        ]:
+            user = User.objects.create_user(name)
+            user.profile.instruments = instruments
+            user.profile.genres = genres
+            user.profile.save()
+
+    def _usernames(self, **params):
+        response = self.client.get('/api/users/musicians/', params)
+        return [u['username'] for u in response.data['results']]
+
+    def test_parse_normalises(self):
+        self.assertEqual(tags.parse(' Bass,vocals,, Double   bass ,BASS'), ['bass', 'double bass', 'vocals'])
+
+    def test_whole_tags_only(self):
+        self.assertEqual(self._usernames(instrument='bass'), ['bassist'])
+        self.assertEqual(self._usernames(instrument='Bassoon'), ['woodwind'])
+
+    def test_any_and_all(self):
+        self.assertEqual(self._usernames(instrument='bass,drums'), ['bassist', 'drummer'])
+        self.assertEqual(self._usernames(instrument='drums,vocals', match='all'), ['drummer'])
+        self.assertEqual(self._usernames(instrument='vocals', genre='rock,funk', match='all'), ['drummer'])
+        self.assertEqual(self._usernames(instrument='vocals', genre='funk'), ['bassist', 'drummer'])
+        self.assertEqual(self._usernames(instrument='bass,tuba', match='all'), [])
+
+    def test_filtered_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/musicians/', {'instrument': 'vocals,drums', 'genre': 'funk', 'match': 'all'})
+
+    def test_profile_edit_retags(self):
+        user = User.objects.get(username='woodwind')
+        self.client.force_authenticate(user)
+        self.client.patch('/api/users/me/', {'instruments': 'bass'}, format='json')
+        self.assertEqual(self._usernames(instrument='bass'), ['bassist', 'woodwind'])
+        self.assertEqual(self._usernames(instrument='bassoon'), [])
+
+    def test_saves_that_leave_the_text_alone_skip_the_sync(self):
+        profile = UserProfile.objects.get(user__username='drummer')
+        with self.assertNumQueries(1):
+            profile.bio = 'Groove first.'
+            profile.save()
+
+    def test_rebuild_matches_incremental_sync(self):
+        before = sorted(ProfileInstrument.objects.values_list('profile_id', 'instrument__name'))
+        ProfileInstrument.objects.all().delete()
+        Instrument.objects.all().delete()
+        call_command('rebuild_profile_tags', stdout=StringIO())
+        self.assertEqual(sorted(ProfileInstrument.objects.values_list('profile_id', 'instrument__name')), before)
+        self.assertEqual(len(before), 5)
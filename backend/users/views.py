@@ -1,38 +1,112 @@
-import json
 import os
-import urllib.parse
-import urllib.request
+import re
+
+import jwt
+import requests
+from django.conf import settings
 from rest_framework import generics, permissions, parsers
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, Max, Q, Value
+from django.db.models.functions import Cast, NullIf, Substr
+from django.shortcuts import get_object_or_404
 from rest_framework_simplejwt.views import TokenObtainPairView as _BaseLoginView
-from .serializers import RegisterSerializer, UserSerializer, UserProfileSerializer
+from . import tags
+from .authentication import LoginSerializer, UserRefreshToken
+from .exceptions import ProviderUnavailable
+from .models import MUSICIAN_SEARCH_INDEX, UserProfile
+from .serializers import RegisterSerializer, UserSerializer, UserProfileSerializer, cached_user_data
 from .throttles import LoginRateThrottle, OTPRateThrottle
+from utils import search
+from utils.http import get_client
+from utils.conditional import ConditionalGetMixin
+from utils.pagination import MusicianCursorPagination
 
 
 class LoginView(_BaseLoginView):
     """JWT login with per-IP rate limiting (10/minute)."""
+    serializer_class = LoginSerializer
     throttle_classes = [LoginRateThrottle]
 
 
 def _unique_username(base):
+    """`base`, or `base` with the next numeric suffix past any already taken.
+
+    One query however many names collide: the username index narrows the
+    scan to names starting with `base`, and the database returns whether
+    `base` itself is taken together with the highest numeric suffix.
+    Suffixes are capped at 18 digits so the cast can't overflow a bigint;
+    longer ones are ignored.
+    """
     base = base[:28]
-    username = base
-    n = 1
-    while User.objects.filter(username=username).exists():
-        username = f"{base}{n}"
-        n += 1
-    return username
+    suffix = Cast(NullIf(Substr('username', len(base) + 1), Value('')), BigIntegerField())
+    taken = User.objects.filter(
+        username__startswith=base, username__regex=rf'^{re.escape(base)}([1-9][0-9]{{0,17}})?$',
+    ).aggregate(base_taken=Count('pk', filter=Q(username=base)), top=Max(suffix))
+    if not taken['base_taken']:
+        return base
+    return f"{base}{(taken['top'] or 0) + 1}"
+
+
+def _get_or_create_social_user(email, username_base, **names):
+    """The user with this email, or a new one with a free username.
+
+    Two sign-ups can pick the same free name at once; the loser's insert
+    fails on the unique username index and it simply allocates again.
+    """
+    user = User.objects.filter(email=email).first()
+    if user is not None:
+        return user, False
+    for attempt in range(3):
+        try:
+            with transaction.atomic():
+                return User.objects.create(username=_unique_username(username_base), email=email, **names), True
+        except IntegrityError:
+            if attempt == 2:
+                raise
+
+
+def _provider_json(method, url, failure, **kwargs):
+    """Call an identity provider and return its JSON body.
+
+    Timeouts, connection errors and 5xx answers raise ProviderUnavailable;
+    anything else the provider rejects raises AuthenticationFailed(failure).
+    """
+    try:
+        resp = get_client().request(method, url, name='oauth', **kwargs)
+    except requests.RequestException:
+        raise ProviderUnavailable()
+    if resp.status_code >= 500:
+        raise ProviderUnavailable()
+    if not resp.ok:
+        raise AuthenticationFailed(failure)
+    try:
+        return resp.json()
+    except ValueError:
+        raise AuthenticationFailed(failure)
+
+
+def _verify_google_id_token(token):
+    """Claims of a Google ID token, checked locally against Google's cached
+    signing keys (users/google_auth.py) — no call to Google per sign-in."""
+    from .google_auth import verify_google_token
+    try:
+        payload = verify_google_token(token, settings.GOOGLE_CLIENT_ID)
+    except jwt.InvalidTokenError:
+        raise AuthenticationFailed('Invalid Google token.')
+    if not payload.get('email_verified'):
+        raise AuthenticationFailed('Google account email is not verified.')
+    return payload
 
 
 def _save_google_picture(user, picture_url):
     """Save Google profile picture URL only if user hasn't uploaded a custom avatar."""
     if picture_url and not user.profile.avatar:
         user.profile.avatar_url = picture_url
-        user.profile.save(update_fields=['avatar_url'])
+        user.profile.save(update_fields=['avatar_url', 'updated_at'])
 
 
 class RegisterView(generics.CreateAPIView):
@@ -65,34 +139,30 @@ class GoogleLoginView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        id_token = request.data.get('id_token')
         access_token = request.data.get('access_token')
-        if not access_token:
-            raise AuthenticationFailed('No access_token provided.')
-
-        try:
-            req = urllib.request.Request(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
-                headers={'Authorization': f'Bearer {access_token}'}
+        if id_token:
+            payload = _verify_google_id_token(id_token)
+        elif access_token:
+            payload = _provider_json(
+                'GET', settings.GOOGLE_USERINFO_URL, 'Invalid Google token.',
+                headers={'Authorization': f'Bearer {access_token}'},
             )
-            with urllib.request.urlopen(req) as resp:
-                payload = json.loads(resp.read())
-        except Exception:
-            raise AuthenticationFailed('Invalid Google token.')
+        else:
+            raise AuthenticationFailed('No id_token or access_token provided.')
 
         email = payload.get('email')
         if not email:
             raise AuthenticationFailed('Google account has no email.')
 
-        user, created = User.objects.get_or_create(email=email)
-        if created:
-            user.username = _unique_username(email.split('@')[0])
-            user.first_name = payload.get('given_name', '')
-            user.last_name = payload.get('family_name', '')
-            user.save()
+        user, _ = _get_or_create_social_user(
+            email, email.split('@')[0],
+            first_name=payload.get('given_name', ''), last_name=payload.get('family_name', ''),
+        )
 
         _save_google_picture(user, payload.get('picture'))
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         return Response({'access': str(refresh.access_token), 'refresh': str(refresh)})
 
 
@@ -122,46 +192,36 @@ class GoogleCodeView(APIView):
         if code_verifier:
             params['code_verifier'] = code_verifier
 
-        try:
-            req = urllib.request.Request(
-                'https://oauth2.googleapis.com/token',
-                data=urllib.parse.urlencode(params).encode(),
-                headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                method='POST',
-            )
-            with urllib.request.urlopen(req) as resp:
-                token_data = json.loads(resp.read())
-        except Exception:
-            raise AuthenticationFailed('Failed to exchange Google authorization code.')
-
-        access_token = token_data.get('access_token')
-        if not access_token:
-            raise AuthenticationFailed('No access token in Google response.')
+        token_data = _provider_json(
+            'POST', settings.GOOGLE_TOKEN_URL, 'Failed to exchange Google authorization code.',
+            data=params,
+        )
 
-        try:
-            req = urllib.request.Request(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
+        # With the openid scope the exchange also returns an ID token, which
+        # carries the profile and saves the userinfo round trip.
+        if token_data.get('id_token'):
+            payload = _verify_google_id_token(token_data['id_token'])
+        else:
+            access_token = token_data.get('access_token')
+            if not access_token:
+                raise AuthenticationFailed('No access token in Google response.')
+            payload = _provider_json(
+                'GET', settings.GOOGLE_USERINFO_URL, 'Failed to fetch Google user info.',
                 headers={'Authorization': f'Bearer {access_token}'},
             )
-            with urllib.request.urlopen(req) as resp:
-                payload = json.loads(resp.read())
-        except Exception:
-            raise AuthenticationFailed('Failed to fetch Google user info.')
 
         email = payload.get('email')
         if not email:
             raise AuthenticationFailed('Google account has no email.')
 
-        user, created = User.objects.get_or_create(email=email)
-        if created:
-            user.username = _unique_username(email.split('@')[0])
-            user.first_name = payload.get('given_name', '')
-            user.last_name = payload.get('family_name', '')
-            user.save()
+        user, _ = _get_or_create_social_user(
+            email, email.split('@')[0],
+            first_name=payload.get('given_name', ''), last_name=payload.get('family_name', ''),
+        )
 
         _save_google_picture(user, payload.get('picture'))
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         return Response({'access': str(refresh.access_token), 'refresh': str(refresh)})
 
 
@@ -183,26 +243,21 @@ class SendPhoneOTPView(APIView):
         code = str(random.randint(100000, 999999))
 
         from .models import PhoneOTP
-        PhoneOTP.objects.filter(user=request.user, is_used=False).update(is_used=True)
-        PhoneOTP.objects.create(user=request.user, code=code)
-
-        from django.core.mail import send_mail
-        try:
-            send_mail(
+        from .outbox import queue_email
+        with transaction.atomic():
+            PhoneOTP.objects.filter(user=request.user, is_used=False).update(is_used=True)
+            PhoneOTP.objects.create(user=request.user, code=code)
+            queue_email(
+                to=email,
                 subject='MusiMeet — phone verification code',
-                message=(
+                body=(
                     f'Hi {request.user.username},\n\n'
                     f'Your phone verification code is:\n\n'
                     f'  {code}\n\n'
                     f'This code expires in 10 minutes.\n\n'
                     f'If you did not request this, you can ignore this email.'
                 ),
-                from_email=None,  # uses DEFAULT_FROM_EMAIL from settings
-                recipient_list=[email],
-                fail_silently=True,
             )
-        except Exception:
-            pass  # OTP is stored; email is best-effort
 
         return Response({'detail': 'Code sent!', 'email': email})
 
@@ -234,7 +289,7 @@ class VerifyPhoneOTPView(APIView):
         otp.save()
 
         request.user.profile.phone_verified = True
-        request.user.profile.save(update_fields=['phone_verified'])
+        request.user.profile.save(update_fields=['phone_verified', 'updated_at'])
 
         return Response(UserSerializer(request.user, context={'request': request}).data)
 
@@ -255,25 +310,21 @@ class ForgotPasswordRequestView(APIView):
             import random
             code = str(random.randint(100000, 999999))
             from .models import PasswordResetOTP
-            PasswordResetOTP.objects.filter(email=email, is_used=False).update(is_used=True)
-            PasswordResetOTP.objects.create(email=email, code=code)
-            from django.core.mail import send_mail
-            try:
-                send_mail(
+            from .outbox import queue_email
+            with transaction.atomic():
+                PasswordResetOTP.objects.filter(email=email, is_used=False).update(is_used=True)
+                PasswordResetOTP.objects.create(email=email, code=code)
+                queue_email(
+                    to=user.email,
                     subject='MusiMeet — password reset code',
-                    message=(
+                    body=(
                         f'Hi {user.username},\n\n'
                         f'Your password reset code is:\n\n'
                         f'  {code}\n\n'
                         f'This code expires in 10 minutes.\n\n'
                         f'If you did not request this, you can ignore this email.'
                     ),
-                    from_email=None,
-                    recipient_list=[user.email],
-                    fail_silently=True,  # OTP is stored; email is best-effort
                 )
-            except Exception:
-                pass  # Email was queued even if SMTP closed with an error
 
         return Response({'detail': 'If that email is registered, a reset code has been sent.'})
 
@@ -308,7 +359,7 @@ class ForgotPasswordConfirmView(APIView):
             return Response({'detail': 'No account found for this email.'}, status=400)
 
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
         otp.is_used = True
         otp.save()
 
@@ -337,7 +388,7 @@ class ChangePasswordView(APIView):
         if len(new_pw) < 8:
             return Response({'detail': 'New password must be at least 8 characters.'}, status=400)
         request.user.set_password(new_pw)
-        request.user.save()
+        request.user.save(update_fields=['password'])
         return Response({'detail': 'Password updated.'})
 
 
@@ -354,7 +405,7 @@ class ChangeEmailView(APIView):
         if User.objects.filter(email__iexact=new_email).exclude(pk=request.user.pk).exists():
             return Response({'detail': 'Email already in use.'}, status=400)
         request.user.email = new_email
-        request.user.save()
+        request.user.save(update_fields=['email'])
         return Response({'detail': 'Email updated.'})
 
 
@@ -365,37 +416,70 @@ class DeleteAccountView(APIView):
         password = request.data.get('password', '')
         if not request.user.check_password(password):
             return Response({'detail': 'Password is incorrect.'}, status=400)
-        request.user.delete()
+        from jams import partners
+        from jams.models import JamSession
+        with transaction.atomic():
+            # Hosted jams go with the account; unwind the co-play edges they
+            # gave other members. Edges to this user cascade on their own.
+            # Locked like a single jam delete, so concurrent joins can't
+            # slip in after the member lists are read.
+            for jam in JamSession.objects.select_for_update().filter(created_by=request.user):
+                partners.record_jam_deleted(jam)
+            # Spots held in other people's jams are freed as the
+            # participations cascade (jams.signals).
+            request.user.delete()
         return Response({'detail': 'Account deleted.'})
 
 
 class MusicianListView(generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = MusicianCursorPagination
 
     def get_queryset(self):
         qs = User.objects.select_related('profile').filter(profile__isnull=False)
         q = self.request.query_params.get('q', '').strip()
-        instrument = self.request.query_params.get('instrument', '').strip()
-        genre = self.request.query_params.get('genre', '').strip()
+        # Comma-separated whole tags; ?match=all requires every one listed,
+        # otherwise any of them will do.
+        instruments = tags.parse(self.request.query_params.get('instrument', ''))
+        genres = tags.parse(self.request.query_params.get('genre', ''))
+        match_all = self.request.query_params.get('match') == 'all'
         skill = self.request.query_params.get('skill_level', '').strip()
         if q:
-            qs = qs.filter(username__icontains=q)
-        if instrument:
-            qs = qs.filter(profile__instruments__icontains=instrument)
-        if genre:
-            qs = qs.filter(profile__genres__icontains=genre)
+            ranked = search.search(qs, MUSICIAN_SEARCH_INDEX, q)
+            qs = qs.filter(username__icontains=q) if ranked is None else ranked
+        if instruments:
+            tagged = tags.tagged_profiles('ProfileInstrument', 'instrument', instruments, match_all)
+            qs = qs.filter(profile__in=tagged)
+        if genres:
+            qs = qs.filter(profile__in=tags.tagged_profiles('ProfileGenre', 'genre', genres, match_all))
         if skill:
             qs = qs.filter(profile__skill_level=skill)
         return qs.order_by('username')
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(cached_user_data(page, request))
+
 
-class PublicProfileView(generics.RetrieveAPIView):
+class PublicProfileView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = User.objects.select_related('profile').all()
     lookup_field = 'username'
 
+    def get_version_stamp(self):
+        # Saves of the User fields in the payload bump the profile's
+        # updated_at too (users.signals), so it covers both.
+        user_id, modified = get_object_or_404(
+            UserProfile.objects.values_list('user_id', 'updated_at'),
+            user__username=self.kwargs['username'],
+        )
+        return (user_id, modified), modified
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(cached_user_data([self.get_object()], request)[0])
+
 
 class FacebookLoginView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -405,30 +489,20 @@ class FacebookLoginView(APIView):
         if not access_token:
             raise AuthenticationFailed('No access_token provided.')
 
-        try:
-            url = (
-                'https://graph.facebook.com/me'
-                '?fields=id,name,email'
-                f'&access_token={access_token}'
-            )
-            req = urllib.request.Request(url)
-            with urllib.request.urlopen(req) as resp:
-                payload = json.loads(resp.read())
-        except Exception:
-            raise AuthenticationFailed('Invalid Facebook token.')
+        payload = _provider_json(
+            'GET', f'{settings.FACEBOOK_GRAPH_URL}/me', 'Invalid Facebook token.',
+            params={'fields': 'id,name,email', 'access_token': access_token},
+        )
 
         fb_id = payload.get('id')
         email = payload.get('email') or f"{fb_id}@facebook.com"
         name = payload.get('name', 'user')
 
-        user, created = User.objects.get_or_create(email=email)
-        if created:
-            base = name.replace(' ', '').lower()
-            user.username = _unique_username(base)
-            parts = name.split(' ')
-            user.first_name = parts[0]
-            user.last_name = parts[-1] if len(parts) > 1 else ''
-            user.save()
+        parts = name.split(' ')
+        user, _ = _get_or_create_social_user(
+            email, name.replace(' ', '').lower(),
+            first_name=parts[0], last_name=parts[-1] if len(parts) > 1 else '',
+        )
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         return Response({'access': str(refresh.access_token), 'refresh': str(refresh)})
@@ -0,0 +1,77 @@
+"""Read-through cache of serialized model representations.
+
+Keys embed the row's version stamp (its `updated_at`), so the write paths
+invalidate entries simply by bumping it — in the same transaction as the
+write itself, which leaves no window where a stale entry can be re-cached.
+Old entries are never read again and age out with
+REPRESENTATION_CACHE_TIMEOUT.
+
+The backend is the `default` entry in CACHES: local memory unless CACHE_URL
+points at a shared cache.
+"""
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import perf
+
+
+class CacheStats:
+    """Hit/miss counters per cache name, for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, name, hits, misses):
+        with self._lock:
+            self._counts[name]['hits'] += hits
+            self._counts[name]['misses'] += misses
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+class RepresentationCache:
+    def __init__(self, name, version):
+        self.name = name            # key prefix and stats bucket
+        self.version = version      # instance -> datetime that moves on every change
+
+    def key(self, instance, variant=''):
+        stamp = int(self.version(instance).timestamp() * 1_000_000)
+        return f'{self.name}:{variant}:{instance.pk}:{stamp}'
+
+    def get_many(self, instances, render, variant=''):
+        """Representations of `instances`, in order.
+
+        `render(missing)` serializes the instances that were not cached and
+        returns their representations in the same order. `variant` separates
+        representations that differ by request (e.g. absolute media URLs).
+        Each result is a fresh dict the caller may add per-request fields to.
+        """
+        keys = [self.key(instance, variant) for instance in instances]
+        found = cache.get_many(keys) if keys else {}
+        missing = [(k, instance) for k, instance in zip(keys, instances) if k not in found]
+        stats.record(self.name, hits=len(keys) - len(missing), misses=len(missing))
+        perf.count('cache-hit', len(keys) - len(missing))
+        perf.count('cache-miss', len(missing))
+        if missing:
+            with perf.track('serialize'):
+                rendered = render([instance for _, instance in missing])
+            fresh = dict(zip((k for k, _ in missing), rendered))
+            cache.set_many(fresh, timeout=settings.REPRESENTATION_CACHE_TIMEOUT)
+            found.update(fresh)
+        return [dict(found[k]) for k in keys]
+
+    def get(self, instance, render, variant=''):
+        return self.get_many([instance], lambda missing: [render(missing[0])], variant)[0]
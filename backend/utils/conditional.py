@@ -0,0 +1,39 @@
+import hashlib
+from abc import ABC, abstractmethod
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin(ABC):
+    """Answer GETs with 304 Not Modified while the client's copy is current.
+
+    Views implement get_version_stamp(), returning a tuple of cheap values
+    (counts, updated_at maxima, ...) that change whenever the payload would,
+    plus the Last-Modified time or None when deletions can't move it. The
+    stamp is checked after authentication and permissions but before the
+    queryset is fetched or serialized.
+    """
+
+    @abstractmethod
+    def get_version_stamp(self):
+        ...
+
+    def get(self, request, *args, **kwargs):
+        parts, last_modified = self.get_version_stamp()
+        digest = hashlib.md5(
+            repr((request.accepted_renderer.format, parts)).encode(), usedforsecurity=False,
+        ).hexdigest()
+        etag = quote_etag(digest)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            if timestamp is not None:
+                response.headers['Last-Modified'] = http_date(timestamp)
+            # Cache, but revalidate every time: payloads can be per-user.
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,68 @@
+"""Shared client for outbound HTTP calls made while serving a request.
+
+One requests.Session per process keeps connections to each host alive
+between calls, so repeat calls to a provider skip the TCP and TLS
+handshakes. Every call is bounded by OUTBOUND_HTTP_CONNECT_TIMEOUT and
+OUTBOUND_HTTP_READ_TIMEOUT, and its duration is added to the request's
+Server-Timing under the name passed in (see utils.perf).
+"""
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    def __init__(self, timeout=None, pool_size=None):
+        self.timeout = timeout
+        pool_size = pool_size or settings.OUTBOUND_HTTP_POOL_SIZE
+        self.session = requests.Session()
+        # pool_maxsize is per host: enough for every worker thread to hold
+        # one connection to the same provider.
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, name='http', **kwargs):
+        kwargs.setdefault('timeout', self.timeout or (
+            settings.OUTBOUND_HTTP_CONNECT_TIMEOUT, settings.OUTBOUND_HTTP_READ_TIMEOUT,
+        ))
+        start = time.perf_counter()
+        try:
+            with perf.track(name):
+                response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            # Only the exception type: its message can repeat the query
+            # string, which may carry a token.
+            logger.warning('%s %s failed after %.0f ms: %s', method, url.split('?')[0],
+                           (time.perf_counter() - start) * 1000, type(e).__name__)
+            raise
+        logger.debug('%s %s -> %d in %.0f ms', method, url.split('?')[0], response.status_code,
+                     (time.perf_counter() - start) * 1000)
+        return response
+
+    def get(self, url, name='http', **kwargs):
+        return self.request('GET', url, name, **kwargs)
+
+    def post(self, url, name='http', **kwargs):
+        return self.request('POST', url, name, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPClient()
+    return _client
@@ -0,0 +1,46 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over a unique ordering, so pages stay stable while
+    rows are inserted and every page costs one indexed range scan."""
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    # ?sort= values, honoured only when the view annotated the matching field
+    # (search_rank from a text search, distance_km from a location search).
+    sort_orderings = {
+        'relevance': ('search_rank', ('-search_rank', 'id')),
+        'distance': ('distance_km', ('distance_km', 'id')),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        sort = self.sort_orderings.get(request.query_params.get('sort'))
+        if sort and sort[0] in queryset.query.annotations:
+            return sort[1]
+        return self.ordering
+
+
+class JamCursorPagination(KeysetPagination):
+    ordering = ('date_time', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering is self.ordering and request.query_params.get('past') == '1':
+            return ('-date_time', '-id')
+        return ordering
+
+
+class MessageCursorPagination(KeysetPagination):
+    # Newest first: the first page is what the chat shows, `next` scrolls back.
+    ordering = ('-created_at', '-id')
+
+
+class MusicianCursorPagination(KeysetPagination):
+    ordering = ('username',)
+
+
+class PartnerCursorPagination(KeysetPagination):
+    ordering = ('-last_jam_at', '-id')
@@ -0,0 +1,140 @@
+"""Per-request performance accounting.
+
+PerformanceMiddleware counts the queries each request runs, the time spent
+in the database, in the view (including rendering) and in blocks wrapped
+with track() — serialization, mainly: every serializer that mixes in
+TimedSerializerMixin reports under `serialize`. With PERF_SERVER_TIMING on, the
+numbers are sent back in a Server-Timing header, which browser dev tools
+and `curl -v` show directly. Requests slower than PERF_SLOW_REQUEST_MS are
+logged together with any SQL they ran more than once.
+"""
+import contextvars
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.timings = defaultdict(float)   # track() name -> seconds
+        self.counters = Counter()           # count() name -> total
+        self.active = set()                 # track() names currently open
+        self.statements = Counter()         # SQL (with placeholders) -> runs
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(), so it sees every
+        # query whether or not DEBUG is on.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, limit=5):
+        """The SQL statements run more than once, most repeated first."""
+        return [(sql, n) for sql, n in self.statements.most_common(limit) if n > 1]
+
+
+def current():
+    """Metrics of the request being handled on this thread, or None."""
+    return _current.get()
+
+
+@contextmanager
+def track(name):
+    """Add the time spent in the block to the current request's `name` timing.
+
+    Nested blocks with the same name count once, through the outermost.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - start
+        metrics.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """Counts a DRF serializer's to_representation() as `serialize` time,
+    whichever view or cache callback asks for its .data."""
+
+    def to_representation(self, instance):
+        with track('serialize'):
+            return super().to_representation(instance)
+
+
+def count(name, n=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[name] += n
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        if settings.PERF_SERVER_TIMING:
+            response.headers['Server-Timing'] = self.server_timing(metrics, total)
+        if _ms(total) >= settings.PERF_SLOW_REQUEST_MS:
+            self.log_slow(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    @staticmethod
+    def server_timing(metrics, total):
+        entries = [f'db;dur={_ms(metrics.db_time)};desc="{metrics.queries} queries"']
+        if metrics.view_started is not None:
+            entries.append(f'view;dur={_ms(time.perf_counter() - metrics.view_started)}')
+        entries.extend(f'{name};dur={_ms(seconds)}' for name, seconds in metrics.timings.items())
+        entries.extend(f'{name};desc="{n}"' for name, n in metrics.counters.items())
+        entries.append(f'total;dur={_ms(total)}')
+        return ', '.join(entries)
+
+    @staticmethod
+    def log_slow(request, response, metrics, total):
+        lines = [
+            f'Slow request: {request.method} {request.get_full_path()} -> {response.status_code} '
+            f'in {_ms(total)} ms ({metrics.queries} queries, {_ms(metrics.db_time)} ms DB'
+            + ''.join(f', {name} {_ms(seconds)} ms' for name, seconds in metrics.timings.items())
+            + ')'
+        ]
+        for sql, n in metrics.duplicates():
+            lines.append(f'  {n}x {sql[:300]}')
+        logger.warning('\n'.join(lines))
@@ -1,8 +1,131 @@
+import logging
+import queue
+import threading
+import time
+
 import requests
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Expo accepts at most 100 messages per request.
+EXPO_BATCH_SIZE = 100
+
+
+class PushDispatcher:
+    """Delivers Expo push messages from a background thread.
+
+    Messages are queued by send_push() and drained in batches of up to 100
+    over one pooled HTTP session. Network errors, 429s and 5xx responses
+    are retried with exponential backoff; tokens Expo reports as
+    DeviceNotRegistered are cleared from their profiles.
+    """
+
+    def __init__(self, url=None, max_retries=None, backoff=None):
+        self.url = url or settings.EXPO_PUSH_URL
+        self.max_retries = settings.PUSH_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.PUSH_RETRY_BACKOFF if backoff is None else backoff
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Content-Type': 'application/json',
+        })
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, messages):
+        for message in messages:
+            self._queue.put(message)
+        self._ensure_worker()
+
+    def flush(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='expo-push', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < EXPO_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.deliver(batch)
+            except Exception:
+                logger.exception('Expo push delivery failed')
+            finally:
+                # Don't hold a DB connection open between batches.
+                connection.close()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def deliver(self, messages):
+        """Send messages synchronously, chunked to Expo's limit."""
+        dead_tokens = []
+        for start in range(0, len(messages), EXPO_BATCH_SIZE):
+            chunk = messages[start:start + EXPO_BATCH_SIZE]
+            tickets = self._post(chunk)
+            for message, ticket in zip(chunk, tickets):
+                details = ticket.get('details') or {}
+                if ticket.get('status') == 'error' and details.get('error') == 'DeviceNotRegistered':
+                    dead_tokens.append(message['to'])
+        if dead_tokens:
+            self.prune_tokens(dead_tokens)
+        return dead_tokens
+
+    def _post(self, chunk):
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.session.post(self.url, json=chunk, timeout=(3, 10))
+            except requests.RequestException:
+                logger.warning('Expo push request failed (attempt %d)', attempt + 1)
+            else:
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    logger.warning('Expo push returned %d (attempt %d)', resp.status_code, attempt + 1)
+                elif resp.ok:
+                    return resp.json().get('data') or []
+                else:
+                    # Malformed request: retrying would fail the same way.
+                    logger.error('Expo push rejected batch: %s', resp.text[:500])
+                    return []
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        logger.error('Giving up on %d Expo push messages', len(chunk))
+        return []
+
+    @staticmethod
+    def prune_tokens(tokens):
+        from users.models import UserProfile
+        UserProfile.objects.filter(expo_push_token__in=tokens).update(expo_push_token='')
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = PushDispatcher()
+    return _dispatcher
 
 
 def send_push(tokens, title, body, data=None):
-    """Send Expo push notifications. Best-effort — never raises."""
+    """Queue Expo push notifications. Returns immediately — never raises."""
     messages = [
         {'to': t, 'title': title, 'body': body, 'data': data or {}}
         for t in tokens if t
@@ -10,10 +133,6 @@ def send_push(tokens, title, body, data=None):
     if not messages:
         return
     try:
-        requests.post(
-            'https://exp.host/--/exponent-push-notification/send',
-            json=messages,
-            timeout=5,
-        )
+        get_dispatcher().enqueue(messages)
     except Exception:
-        pass
+        logger.exception('Could not queue Expo push messages')
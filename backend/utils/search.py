@@ -0,0 +1,181 @@
+"""Ranked full-text search for jams and musicians.
+
+Each SearchIndex keeps one text document per row. On Postgres the document
+is a `search_vector` tsvector column (GIN-indexed) on the indexed table
+itself; on SQLite it lives in an FTS5 shadow table keyed by rowid. Both are
+written from post_save/post_delete signals and can be rebuilt with
+`manage.py rebuild_search_index`.
+
+Queries are split into word tokens and matched as an AND of prefixes, so
+"jazz maas" finds "Jazz night in Maastricht".
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())[:16]
+
+
+class SearchIndex:
+    def __init__(self, name, table, key_column, document):
+        self.name = name                    # FTS5 shadow table is <name>_fts
+        self.table = table                  # table holding the indexed rows
+        self.key_column = key_column        # column the queryset's pk maps to
+        self.document = document            # instance -> searchable text
+
+    @property
+    def fts_table(self):
+        return f'{self.name}_fts'
+
+
+class SqliteBackend:
+    def create(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.fts_table} "
+                f"USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {index.fts_table}')
+
+    def update(self, index, rows):
+        """Write (key, text) documents, replacing any existing ones."""
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {index.fts_table} WHERE rowid = %s', [[k] for k, _ in rows])
+            cursor.executemany(f'INSERT INTO {index.fts_table} (rowid, body) VALUES (%s, %s)', rows)
+
+    def remove(self, index, key):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {index.fts_table} WHERE rowid = %s', [key])
+
+    def clear(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {index.fts_table}')
+
+    def match_expression(self, tokens):
+        return ' '.join(f'"{t}"*' for t in tokens)
+
+    def matching_keys_sql(self, index):
+        return f'SELECT rowid FROM {index.fts_table} WHERE {index.fts_table} MATCH %s'
+
+    def rank_sql(self, index, outer_key):
+        # bm25() is lower-is-better; negate so higher ranks sort first everywhere.
+        return (
+            f'(SELECT -bm25({index.fts_table}) FROM {index.fts_table} '
+            f'WHERE {index.fts_table} MATCH %s AND rowid = {outer_key})'
+        )
+
+
+class PostgresBackend:
+    def create(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {index.table} ADD COLUMN IF NOT EXISTS search_vector tsvector')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index.name}_search_gin '
+                f'ON {index.table} USING GIN (search_vector)'
+            )
+
+    def drop(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {index.name}_search_gin')
+            cursor.execute(f'ALTER TABLE {index.table} DROP COLUMN IF EXISTS search_vector')
+
+    def update(self, index, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {index.table} SET search_vector = to_tsvector('simple', %s) "
+                f'WHERE {index.key_column} = %s',
+                [[text, key] for key, text in rows],
+            )
+
+    def remove(self, index, key):
+        pass  # the vector is deleted with its row
+
+    def clear(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {index.table} SET search_vector = NULL')
+
+    def match_expression(self, tokens):
+        return ' & '.join(f'{t}:*' for t in tokens)
+
+    def matching_keys_sql(self, index):
+        return (
+            f'SELECT {index.key_column} FROM {index.table} '
+            f"WHERE search_vector @@ to_tsquery('simple', %s)"
+        )
+
+    def rank_sql(self, index, outer_key):
+        return (
+            f"(SELECT ts_rank(search_vector, to_tsquery('simple', %s)) FROM {index.table} "
+            f'WHERE {index.key_column} = {outer_key})'
+        )
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    if connection.vendor == 'sqlite':
+        return SqliteBackend()
+    return None
+
+
+def update_document(index, instance, key=None):
+    backend = get_backend()
+    if backend is not None:
+        backend.update(index, [(instance.pk if key is None else key, index.document(instance))])
+
+
+def remove_document(index, key):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove(index, key)
+
+
+def search(queryset, index, query):
+    """Filter `queryset` to rows matching `query`, annotated with `search_rank`.
+
+    Returns None when this database has no search backend, so callers can
+    fall back to their icontains filters.
+    """
+    backend = get_backend()
+    if backend is None:
+        return None
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    expression = backend.match_expression(tokens)
+    opts = queryset.model._meta
+    outer_key = f'{connection.ops.quote_name(opts.db_table)}.{connection.ops.quote_name(opts.pk.column)}'
+    return queryset.filter(
+        pk__in=RawSQL(backend.matching_keys_sql(index), [expression]),
+    ).annotate(
+        search_rank=RawSQL(backend.rank_sql(index, outer_key), [expression], output_field=FloatField()),
+    )
+
+
+def rebuild(index, queryset, key=lambda instance: instance.pk, batch_size=1000):
+    """Re-index every row of `queryset` from scratch."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    backend.clear(index)
+    count = 0
+    batch = []
+    for instance in queryset.iterator(chunk_size=batch_size):
+        batch.append((key(instance), index.document(instance)))
+        if len(batch) >= batch_size:
+            backend.update(index, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        backend.update(index, batch)
+        count += len(batch)
+    return count
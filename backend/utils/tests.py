@@ -0,0 +1,222 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import perf
+from .cache import RepresentationCache, stats
+from .push import PushDispatcher
+
+
+class StubExpoServer:
+    """Local stand-in for the Expo push API.
+
+    `responses` is consumed one per request as (status, body); once it runs
+    out every message gets an "ok" ticket.
+    """
+
+    def __init__(self, responses=None):
+        self.requests = []
+        self.responses = list(responses or [])
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                messages = json.loads(self.rfile.read(length))
+                stub.requests.append(messages)
+                if stub.responses:
+                    status, body = stub.responses.pop(0)
+                else:
+                    status, body = 200, {'data': [{'status': 'ok', 'id': 'x'} for _ in messages]}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/push/send'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def message(token):
+    return {'to': token, 'title': 't', 'body': 'b', 'data': {}}
+
+
+class PushDispatcherTests(TestCase):
+    def setUp(self):
+        self.expo = StubExpoServer()
+        self.addCleanup(self.expo.stop)
+
+    def dispatcher(self, **kwargs):
+        return PushDispatcher(url=self.expo.url, backoff=0, **kwargs)
+
+    def test_chunks_to_expo_limit(self):
+        self.dispatcher().deliver([message(f'ExponentPushToken[{i}]') for i in range(250)])
+        self.assertEqual([len(r) for r in self.expo.requests], [100, 100, 50])
+
+    def test_retries_server_errors(self):
+        self.expo.responses = [(503, {}), (429, {})]
+        with self.assertLogs('utils.push', 'WARNING'):
+            self.dispatcher().deliver([message('ExponentPushToken[a]')])
+        self.assertEqual(len(self.expo.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.expo.responses = [(500, {})] * 5
+        with self.assertLogs('utils.push', 'ERROR'):
+            self.dispatcher(max_retries=2).deliver([message('ExponentPushToken[a]')])
+        self.assertEqual(len(self.expo.requests), 3)
+
+    def test_prunes_unregistered_tokens(self):
+        alive = User.objects.create_user('alive')
+        dead = User.objects.create_user('dead')
+        alive.profile.expo_push_token = 'ExponentPushToken[alive]'
+        alive.profile.save()
+        dead.profile.expo_push_token = 'ExponentPushToken[dead]'
+        dead.profile.save()
+        self.expo.responses = [(200, {'data': [
+            {'status': 'ok', 'id': '1'},
+            {'status': 'error', 'message': 'gone', 'details': {'error': 'DeviceNotRegistered'}},
+        ]})]
+        self.dispatcher().deliver([message('ExponentPushToken[alive]'), message('ExponentPushToken[dead]')])
+        alive.profile.refresh_from_db()
+        dead.profile.refresh_from_db()
+        self.assertEqual(alive.profile.expo_push_token, 'ExponentPushToken[alive]')
+        self.assertEqual(dead.profile.expo_push_token, '')
+
+    def test_enqueue_returns_before_delivery_and_batches(self):
+        dispatcher = self.dispatcher()
+        dispatcher.enqueue([message(f'ExponentPushToken[{i}]') for i in range(3)])
+        dispatcher.flush()
+        self.assertEqual(sum(len(r) for r in self.expo.requests), 3)
+
+
+class RepresentationCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.cache = RepresentationCache('thing', version=lambda obj: obj.updated_at)
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.rendered = []
+
+    def _render(self, missing):
+        self.rendered.append([obj.pk for obj in missing])
+        return [{'pk': obj.pk, 'name': obj.name} for obj in missing]
+
+    def _thing(self, pk, name='a', age=0):
+        return SimpleNamespace(pk=pk, name=name, updated_at=self.now + timedelta(seconds=age))
+
+    def test_renders_only_misses_and_keeps_order(self):
+        self.cache.get_many([self._thing(1), self._thing(2)], self._render)
+        data = self.cache.get_many([self._thing(3), self._thing(2), self._thing(1)], self._render)
+        self.assertEqual([d['pk'] for d in data], [3, 2, 1])
+        self.assertEqual(self.rendered, [[1, 2], [3]])
+        self.assertEqual(stats.snapshot(), {'thing': {'hits': 2, 'misses': 3}})
+
+    def test_new_version_misses(self):
+        self.cache.get(self._thing(1, 'old'), lambda obj: self._render([obj])[0])
+        data = self.cache.get(self._thing(1, 'new', age=1), lambda obj: self._render([obj])[0])
+        self.assertEqual(data['name'], 'new')
+
+    def test_variants_are_separate(self):
+        self.cache.get_many([self._thing(1)], self._render, variant='x')
+        self.cache.get_many([self._thing(1)], self._render, variant='y')
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_results_are_copies(self):
+        self.cache.get_many([self._thing(1)], self._render)[0]['extra'] = True
+        self.assertNotIn('extra', self.cache.get_many([self._thing(1)], self._render)[0])
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def _middleware(self, view):
+        return perf.PerformanceMiddleware(lambda request: view(request))
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_reports_queries_and_tracked_blocks(self):
+        def view(request):
+            User.objects.count()
+            User.objects.exists()
+            with perf.track('serialize'):
+                pass
+            perf.count('cache-hit', 2)
+            return HttpResponse()
+
+        response = self._middleware(view)(RequestFactory().get('/'))
+        timing = response['Server-Timing']
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('cache-hit;desc="2"', timing)
+        self.assertIn('total;dur=', timing)
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_header_is_optional(self):
+        response = self._middleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_log_repeated_sql(self):
+        def view(request):
+            for pk in range(3):
+                User.objects.filter(pk=pk).first()
+            User.objects.count()
+            return HttpResponse()
+
+        with self.assertLogs('utils.perf', 'WARNING') as logs:
+            self._middleware(view)(RequestFactory().get('/api/jams/?page_size=5'))
+        message = logs.output[0]
+        self.assertIn('GET /api/jams/?page_size=5 -> 200', message)
+        self.assertIn('4 queries', message)
+        self.assertIn('3x SELECT', message)
+        self.assertNotIn('COUNT', message.split('\n', 1)[1])
+
+    def test_api_responses_carry_the_header(self):
+        with self.settings(PERF_SERVER_TIMING=True):
+            response = self.client.get('/api/jams/')
+        self.assertIn('view;dur=', response['Server-Timing'])
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_nested_blocks_count_once(self):
+        seen = []
+
+        def view(request):
+            with perf.track('serialize'):
+                start = perf.current().timings['serialize']
+                with perf.track('serialize'):
+                    pass
+                seen.append(perf.current().timings['serialize'] - start)
+            return HttpResponse()
+
+        response = self._middleware(view)(RequestFactory().get('/'))
+        self.assertEqual(seen, [0])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_uncached_endpoints_report_serialize_time(self):
+        user = User.objects.create_user('timed', password='pw-123456')
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.settings(PERF_SERVER_TIMING=True):
+            response = client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_track_outside_a_request_is_a_no_op(self):
+        with perf.track('serialize'):
+            perf.count('cache-hit')
+        self.assertIsNone(perf.current())
@@ -9,16 +9,60 @@ export const API_URL =
 
 const client = axios.create({ baseURL: API_URL })
 
+// Query params of a paginated response's `next` link. Requests send these
+// against our own baseURL, so the link's scheme and host don't matter.
+export function pageParams(url) {
+  const params = {}
+  const query = url?.split('?')[1]
+  if (!query) return params
+  for (const pair of query.split('&')) {
+    const [key, value = ''] = pair.split('=')
+    params[decodeURIComponent(key)] = decodeURIComponent(value.replace(/\+/g, ' '))
+  }
+  return params
+}
+
+// Last response per GET URL, revalidated with If-None-Match so unchanged
+// feeds and profiles come back as an empty 304.
+const MAX_CACHED = 50
+const etagCache = new Map()
+
+function fromCache(res) {
+  const cached = etagCache.get(res.config._etagKey)
+  if (!cached) return null
+  return { ...res, status: 200, data: cached.data }
+}
+
 client.interceptors.request.use(async (config) => {
   const token = await SecureStore.getItemAsync('access')
   if (token) config.headers.Authorization = `Bearer ${token}`
+  if ((config.method ?? 'get') === 'get') {
+    config._etagKey = client.getUri(config)
+    const cached = etagCache.get(config._etagKey)
+    if (cached) config.headers['If-None-Match'] = cached.etag
+  }
   return config
 })
 
 client.interceptors.response.use(
-  (res) => res,
+  (res) => {
+    const key = res.config._etagKey
+    if (!key) return res
+    if (res.status === 304) return fromCache(res) ?? res
+    const etag = res.headers?.etag
+    if (etag) {
+      etagCache.delete(key)
+      etagCache.set(key, { etag, data: res.data })
+      if (etagCache.size > MAX_CACHED) etagCache.delete(etagCache.keys().next().value)
+    }
+    return res
+  },
   async (error) => {
     const original = error.config
+    if (error.response?.status === 304 && original?._etagKey) {
+      const cached = fromCache(error.response)
+      if (cached) return cached
+    }
     if (error.response?.status === 401 && !original._retry) {
       original._retry = true
       const refresh = await SecureStore.getItemAsync('refresh')
@@ -1,7 +1,7 @@
 import { useEffect, useState, useCallback, useRef } from 'react'
 import { View, Text, FlatList, TextInput, TouchableOpacity, StyleSheet, KeyboardAvoidingView, Platform } from 'react-native'
 import { useAuth } from '../context/AuthContext'
-import client from '../api/client'
+import client, { pageParams } from '../api/client'
 
 function MessageBubble({ msg, isMe }) {
   const time = new Date(msg.created_at).toLocaleTimeString(undefined, { hour: '2-digit', minute: '2-digit', hour12: false })
@@ -24,16 +24,70 @@ export default function ChatScreen({ route, navigation }) {
   const [sending, setSending] = useState(false)
   const listRef = useRef(null)
   const pollRef = useRef(null)
+  const lastIdRef = useRef(null)
+  // Params for the next older page of history; null once we've reached the start.
+  const olderRef = useRef(null)
+  const loadingOlderRef = useRef(false)
+  const scrolledToRef = useRef(null)
 
   const fetchMessages = useCallback(async () => {
     try {
-      const { data } = await client.get(`/jams/${jam.id}/messages/`)
-      setMessages(data)
+      if (lastIdRef.current === null) {
+        const { data } = await client.get(`/jams/${jam.id}/messages/`)
+        // Pages come newest first; the list renders oldest at the top.
+        const initial = [...data.results].reverse()
+        setMessages(initial)
+        lastIdRef.current = initial.length ? initial[initial.length - 1].id : 0
+        olderRef.current = data.next ? pageParams(data.next) : null
+        return
+      }
+      // Only ask for what arrived since the last message we have; 304 means nothing new.
+      const { status, data } = await client.get(`/jams/${jam.id}/messages/`, {
+        params: { after: lastIdRef.current },
+        validateStatus: (s) => s === 200 || s === 304,
+      })
+      if (status === 200 && data.length) {
+        lastIdRef.current = Math.max(lastIdRef.current, data[data.length - 1].id)
+        // A send and a poll can overlap; skip anything already shown.
+        setMessages((prev) => {
+          const shown = prev.length ? prev[prev.length - 1].id : 0
+          return [...prev, ...data.filter((m) => m.id > shown)]
+        })
+      }
     } catch {
       // silent fail during polling
     }
   }, [jam.id])
 
+  const fetchOlder = useCallback(async () => {
+    // Not before the first page has been scrolled to the bottom, or the
+    // list's initial top position would page back straight away.
+    if (!olderRef.current || loadingOlderRef.current || scrolledToRef.current === null) return
+    loadingOlderRef.current = true
+    try {
+      const { data } = await client.get(`/jams/${jam.id}/messages/`, { params: olderRef.current })
+      const older = [...data.results].reverse()
+      olderRef.current = data.next ? pageParams(data.next) : null
+      setMessages((prev) => {
+        const first = prev.length ? prev[0].id : Infinity
+        return [...older.filter((m) => m.id < first), ...prev]
+      })
+    } catch {
+      // keep what we have; scrolling up again retries
+    } finally {
+      loadingOlderRef.current = false
+    }
+  }, [jam.id])
+
+  // Follow new messages to the bottom, but stay put when older ones are
+  // added above.
+  const handleContentSizeChange = () => {
+    const newest = messages.length ? messages[messages.length - 1].id : null
+    if (newest === scrolledToRef.current) return
+    scrolledToRef.current = newest
+    listRef.current?.scrollToEnd({ animated: false })
+  }
+
   useEffect(() => {
     navigation.setOptions({
       title: jam.title,
@@ -73,7 +127,10 @@ export default function ChatScreen({ route, navigation }) {
         data={messages}
         keyExtractor={(item) => String(item.id)}
         renderItem={({ item }) => <MessageBubble msg={item} isMe={item.sender === user?.username} />}
-        onContentSizeChange={() => listRef.current?.scrollToEnd({ animated: false })}
+        onContentSizeChange={handleContentSizeChange}
+        onStartReached={fetchOlder}
+        onStartReachedThreshold={0.2}
+        maintainVisibleContentPosition={{ minIndexForVisible: 0 }}
         contentContainerStyle={{ padding: 16, paddingBottom: 8 }}
         ListEmptyComponent={<Text style={styles.empty}>No messages yet. Say hi! 👋</Text>}
       />
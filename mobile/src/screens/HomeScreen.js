@@ -1,8 +1,8 @@
-import { useEffect, useState, useCallback } from 'react'
+import { useEffect, useState, useCallback, useRef } from 'react'
 import { View, Text, SectionList, TouchableOpacity, StyleSheet, RefreshControl, Alert, TextInput, ScrollView } from 'react-native'
 import { useFocusEffect } from '@react-navigation/native'
 import { useAuth } from '../context/AuthContext'
-import client from '../api/client'
+import client, { pageParams } from '../api/client'
 
 const GENRES = ['jazz', 'rock', 'pop', 'hiphop', 'classical', 'other']
 const SKILLS = ['beginner', 'intermediate', 'advanced']
@@ -71,6 +71,8 @@ export default function HomeScreen({ navigation }) {
   const [filterGenre, setFilterGenre] = useState('')
   const [filterSkill, setFilterSkill] = useState('')
   const [showPast, setShowPast] = useState(false)
+  const [nextPage, setNextPage] = useState(null)
+  const loadingMoreRef = useRef(false)
 
   const fetchJams = useCallback(async (q, genre, skill, past) => {
     try {
@@ -80,7 +82,8 @@ export default function HomeScreen({ navigation }) {
       if (skill) params.skill_level = skill
       if (past) params.past = '1'
       const { data } = await client.get('/jams/', { params })
-      setJams(data)
+      setJams(data.results)
+      setNextPage(data.next)
     } catch {
       Alert.alert('Error', 'Could not load jam sessions.')
     } finally {
@@ -89,6 +92,20 @@ export default function HomeScreen({ navigation }) {
     }
   }, [])
 
+  const fetchMoreJams = useCallback(async () => {
+    if (!nextPage || loadingMoreRef.current) return
+    loadingMoreRef.current = true
+    try {
+      const { data } = await client.get('/jams/', { params: pageParams(nextPage) })
+      setJams((prev) => [...prev, ...data.results])
+      setNextPage(data.next)
+    } catch {
+      // keep what we have; the next scroll retries
+    } finally {
+      loadingMoreRef.current = false
+    }
+  }, [nextPage])
+
   useEffect(() => {
     fetchJams(search, filterGenre, filterSkill, showPast)
   }, [search, filterGenre, filterSkill, showPast, fetchJams])
@@ -179,6 +196,8 @@ export default function HomeScreen({ navigation }) {
           <Text style={styles.dateHeader}>{title}</Text>
         )}
         ItemSeparatorComponent={() => <View style={styles.separator} />}
+        onEndReached={fetchMoreJams}
+        onEndReachedThreshold={0.5}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={() => { setRefreshing(true); fetchJams(search, filterGenre, filterSkill, showPast) }} tintColor="#aaa" />
         }
@@ -39,9 +39,13 @@ export default function LoginScreen({ navigation }) {
   useEffect(() => {
     if (response?.type === 'success') {
       const code = response.params?.code
+      const idToken = response.params?.id_token || response.authentication?.idToken
       const accessToken = response.authentication?.accessToken
       if (code) {
         handleGoogleCode(code, request?.codeVerifier)
+      } else if (idToken) {
+        // Verified on the server without a call to Google.
+        handleGoogleToken({ id_token: idToken })
       } else if (accessToken) {
         handleGoogleToken(accessToken)
       }
@@ -61,11 +65,11 @@ export default function LoginScreen({ navigation }) {
     }
   }
 
-  async function handleGoogleToken(accessToken) {
+  async function handleGoogleToken(token) {
     setSocialLoading(true)
     setError('')
     try {
-      await socialLogin('google', accessToken)
+      await socialLogin('google', token)
       navigation.goBack()
     } catch {
       setError('Google sign-in failed. Please try again.')
@@ -1,6 +1,6 @@
-import { useEffect, useState, useCallback } from 'react'
+import { useEffect, useState, useCallback, useRef } from 'react'
 import { View, Text, FlatList, TouchableOpacity, StyleSheet, TextInput, Image, RefreshControl, ScrollView } from 'react-native'
-import client from '../api/client'
+import client, { pageParams } from '../api/client'
 
 const SKILLS = ['beginner', 'intermediate', 'advanced']
 
@@ -47,6 +47,8 @@ export default function MusiciansScreen({ navigation }) {
   const [refreshing, setRefreshing] = useState(false)
   const [search, setSearch] = useState('')
   const [filterSkill, setFilterSkill] = useState('')
+  const [nextPage, setNextPage] = useState(null)
+  const loadingMoreRef = useRef(false)
 
   const fetchMusicians = useCallback(async (q, skill) => {
     try {
@@ -54,7 +56,8 @@ export default function MusiciansScreen({ navigation }) {
       if (q) params.q = q
       if (skill) params.skill_level = skill
       const { data } = await client.get('/users/musicians/', { params })
-      setMusicians(data)
+      setMusicians(data.results)
+      setNextPage(data.next)
     } catch {
       // silent fail — list just stays empty
     } finally {
@@ -63,6 +66,20 @@ export default function MusiciansScreen({ navigation }) {
     }
   }, [])
 
+  const fetchMoreMusicians = useCallback(async () => {
+    if (!nextPage || loadingMoreRef.current) return
+    loadingMoreRef.current = true
+    try {
+      const { data } = await client.get('/users/musicians/', { params: pageParams(nextPage) })
+      setMusicians((prev) => [...prev, ...data.results])
+      setNextPage(data.next)
+    } catch {
+      // keep what we have; the next scroll retries
+    } finally {
+      loadingMoreRef.current = false
+    }
+  }, [nextPage])
+
   useEffect(() => {
     fetchMusicians(search, filterSkill)
   }, [search, filterSkill, fetchMusicians])
@@ -103,6 +120,8 @@ export default function MusiciansScreen({ navigation }) {
         keyExtractor={(item) => String(item.id)}
         renderItem={({ item }) => <MusicianCard item={item} navigation={navigation} />}
         ItemSeparatorComponent={() => <View style={styles.separator} />}
+        onEndReached={fetchMoreMusicians}
+        onEndReachedThreshold={0.5}
         refreshControl={
           <RefreshControl
             refreshing={refreshing}